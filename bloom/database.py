@@ -4,10 +4,17 @@ This module provides SQLite database setup and connection management.
 All timestamps use ISO8601 format.
 """
 
+import io
+import logging
 import os
 import sqlite3
+import time
 from typing import Optional, TypedDict
 
+from PIL import Image
+
+logger = logging.getLogger("bloom.database")
+
 # Load MAX_IMAGE_SIZE from environment (used for image validation)
 MAX_IMAGE_SIZE = int(os.getenv("MAX_IMAGE_SIZE", "5242880"))  # 5MB in bytes for 2K resolution images
 
@@ -18,9 +25,52 @@ class SyllabusLoadResultDict(TypedDict):
     subtopics_loaded: int
 
 
+# Bumped whenever cached expositions/images are removed, so in-process caches
+# layered on top of them know to drop their entries
+_cache_generation = 0
+
+
+def cache_generation() -> int:
+    """Get the counter that changes whenever cached content is removed.
+    
+    Returns:
+        Current cache generation
+    """
+    return _cache_generation
+
+
+def _bump_cache_generation() -> None:
+    """Mark all in-process copies of cached expositions/images as stale."""
+    global _cache_generation
+    _cache_generation += 1
+
+
+# Last formatted timestamp as (epoch_second, iso_string)
+_iso_now_cache: tuple[int, str] = (0, "")
+
+
+def iso_now() -> str:
+    """Get the current UTC time as an ISO8601 string (second resolution).
+    
+    The formatted string is cached and only rebuilt when the wall-clock second
+    changes, so hot paths (message appends) don't build a datetime per call.
+    
+    Returns:
+        Timestamp like "2025-01-31T14:05:09+00:00"
+    """
+    global _iso_now_cache
+    now = int(time.time())
+    if now != _iso_now_cache[0]:
+        _iso_now_cache = (now, time.strftime("%Y-%m-%dT%H:%M:%S+00:00", time.gmtime(now)))
+    return _iso_now_cache[1]
+
+
 def get_connection(db_path: str = "bloom.db") -> sqlite3.Connection:
     """Get a database connection with foreign keys enabled.
     
+    Uses synchronous=NORMAL, which is durable across application crashes in
+    WAL mode (set by init_database) and avoids an fsync on every commit.
+    
     Args:
         db_path: Path to SQLite database file
         
@@ -29,6 +79,7 @@ def get_connection(db_path: str = "bloom.db") -> sqlite3.Connection:
     """
     conn = sqlite3.connect(db_path)
     conn.execute("PRAGMA foreign_keys = ON;")
+    conn.execute("PRAGMA synchronous = NORMAL;")
     conn.row_factory = sqlite3.Row  # Enable column access by name
     return conn
 
@@ -53,6 +104,9 @@ def init_database(db_path: str = "bloom.db") -> None:
     conn = get_connection(db_path)
     cursor = conn.cursor()
     
+    # WAL lets readers proceed while a write is in progress (persists in the file)
+    cursor.execute("PRAGMA journal_mode = WAL;")
+    
     # Create all tables
     cursor.executescript("""
         -- Syllabus structure: Topics (high-level categories)
@@ -131,6 +185,7 @@ def init_database(db_path: str = "bloom.db") -> None:
             exposition_content TEXT NOT NULL,
             generated_at TEXT NOT NULL,
             model_identifier TEXT NOT NULL,
+            prompt_version TEXT NOT NULL DEFAULT 'v1',
             FOREIGN KEY (subtopic_id) REFERENCES subtopics(id) ON DELETE CASCADE
         );
         
@@ -147,6 +202,14 @@ def init_database(db_path: str = "bloom.db") -> None:
         );
     """)
     
+    # Add columns introduced after an existing database was created
+    cursor.execute("PRAGMA table_info(cached_expositions)")
+    exposition_columns = {row["name"] for row in cursor.fetchall()}
+    if "prompt_version" not in exposition_columns:
+        cursor.execute(
+            "ALTER TABLE cached_expositions ADD COLUMN prompt_version TEXT NOT NULL DEFAULT 'v1'"
+        )
+    
     conn.commit()
     conn.close()
     # Note: Logging handled by main.py during startup
@@ -195,6 +258,8 @@ def load_syllabus_from_json(syllabus_data: dict, db_path: str = "bloom.db") -> S
                 subtopics_count += 1
         
         conn.commit()
+        # Deleting topics cascades to cached expositions and images
+        _bump_cache_generation()
         return {
             "topics_loaded": topics_count,
             "subtopics_loaded": subtopics_count
@@ -215,13 +280,14 @@ def get_cached_exposition(subtopic_id: int, db_path: str = "bloom.db") -> Option
         db_path: Path to database file
         
     Returns:
-        Dict with keys {exposition_content, generated_at, model_identifier} or None if not cached
+        Dict with keys {exposition_content, generated_at, model_identifier, prompt_version}
+        or None if not cached
     """
     conn = get_connection(db_path)
     cursor = conn.cursor()
     
     cursor.execute("""
-        SELECT exposition_content, generated_at, model_identifier
+        SELECT exposition_content, generated_at, model_identifier, prompt_version
         FROM cached_expositions
         WHERE subtopic_id = ?
     """, (subtopic_id,))
@@ -234,6 +300,7 @@ def get_cached_exposition(subtopic_id: int, db_path: str = "bloom.db") -> Option
             "exposition_content": row["exposition_content"],
             "generated_at": row["generated_at"],
             "model_identifier": row["model_identifier"],
+            "prompt_version": row["prompt_version"],
         }
     return None
 
@@ -242,7 +309,8 @@ def save_cached_exposition(
     subtopic_id: int,
     content: str,
     model_identifier: str,
-    db_path: str = "bloom.db"
+    db_path: str = "bloom.db",
+    prompt_version: str = "v1"
 ) -> None:
     """Save generated exposition to cache.
     
@@ -251,17 +319,16 @@ def save_cached_exposition(
         content: Full text of the exposition
         model_identifier: LLM model used (e.g., "gpt-4", "claude-3-5-sonnet-20241022")
         db_path: Path to database file
+        prompt_version: Version of the prompt the exposition was generated with
     """
-    from datetime import datetime
-    
     conn = get_connection(db_path)
     cursor = conn.cursor()
     
     cursor.execute("""
         INSERT OR REPLACE INTO cached_expositions 
-        (subtopic_id, exposition_content, generated_at, model_identifier)
-        VALUES (?, ?, ?, ?)
-    """, (subtopic_id, content, datetime.utcnow().isoformat(), model_identifier))
+        (subtopic_id, exposition_content, generated_at, model_identifier, prompt_version)
+        VALUES (?, ?, ?, ?, ?)
+    """, (subtopic_id, content, iso_now(), model_identifier, prompt_version))
     
     conn.commit()
     conn.close()
@@ -287,12 +354,6 @@ def validate_image_data(image_data: bytes, max_size: int = MAX_IMAGE_SIZE) -> bo
     Returns:
         True if image passes all validation checks, False otherwise
     """
-    import logging
-    from PIL import Image
-    import io
-    
-    logger = logging.getLogger("bloom.database")
-    
     # Check file size
     if len(image_data) > max_size:
         logger.warning(f"Image validation failed: size {len(image_data)} exceeds max {max_size}")
@@ -371,12 +432,6 @@ def save_cached_image(
         prompt_version: Version of prompt template used (default: "v1")
         db_path: Path to database file
     """
-    from datetime import datetime
-    import logging
-    from PIL import Image
-    import io
-    
-    logger = logging.getLogger("bloom.database")
     file_size = len(image_data)
     
     # Detect actual image format
@@ -408,7 +463,7 @@ def save_cached_image(
         subtopic_id, 
         image_data, 
         image_format,
-        datetime.utcnow().isoformat(), 
+        iso_now(), 
         prompt_version,
         model_identifier,
         file_size
@@ -427,10 +482,6 @@ def delete_cached_image(subtopic_id: int, db_path: str = "bloom.db") -> None:
         subtopic_id: Subtopic ID whose image should be deleted
         db_path: Path to database file
     """
-    import logging
-    
-    logger = logging.getLogger("bloom.database")
-    
     # Get file size before deletion for logging
     cached = get_cached_image(subtopic_id, db_path)
     file_size = cached.get("file_size", 0) if cached else 0
@@ -447,6 +498,7 @@ def delete_cached_image(subtopic_id: int, db_path: str = "bloom.db") -> None:
     
     conn.commit()
     conn.close()
+    _bump_cache_generation()
     
     if deleted:
         logger.info(
@@ -465,10 +517,6 @@ def delete_all_cached_images(db_path: str = "bloom.db") -> int:
     Returns:
         Number of images deleted
     """
-    import logging
-    
-    logger = logging.getLogger("bloom.database")
-    
     # Get total size before deletion for logging
     conn = get_connection(db_path)
     cursor = conn.cursor()
@@ -483,6 +531,7 @@ def delete_all_cached_images(db_path: str = "bloom.db") -> int:
     
     conn.commit()
     conn.close()
+    _bump_cache_generation()
     
     if deleted_count > 0:
         logger.info(
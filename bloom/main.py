@@ -14,6 +14,7 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
+from jinja2 import FileSystemBytecodeCache
 
 from bloom.database import init_database
 
@@ -52,6 +53,9 @@ IMAGE_GENERATION_MODEL = os.getenv("IMAGE_GENERATION_MODEL", "gemini-3-pro-image
 IMAGE_GENERATION_RESOLUTION = os.getenv("IMAGE_GENERATION_RESOLUTION", "2K")
 MAX_IMAGE_SIZE = int(os.getenv("MAX_IMAGE_SIZE", "5242880"))  # 5MB in bytes for 2K resolution images
 
+# Template Configuration
+TEMPLATE_AUTO_RELOAD = os.getenv("TEMPLATE_AUTO_RELOAD", "true").lower() == "true"  # false in production
+
 # Validate API key for selected provider
 def validate_api_keys():
     """Ensure the API key for the selected provider is set."""
@@ -88,6 +92,11 @@ async def lifespan(_app: FastAPI):
     logger.info("✓ Database initialized: %s", DATABASE_PATH)
     logger.info("✓ Completion threshold: %s correct answers", COMPLETION_THRESHOLD)
     
+    # Open the LLM provider connection now rather than on the first request
+    from bloom.tutor_agent import llm_client
+
+    await llm_client.warm_up()
+    
     # Log image generation configuration
     if ENABLE_IMAGE_GENERATION:
         logger.info("✓ Image generation enabled: %s at %s resolution (max size: %d MB)", 
@@ -102,6 +111,10 @@ async def lifespan(_app: FastAPI):
     
     # Shutdown
     logger.info("👋 Shutting down Bloom...")
+    from bloom.tutor_agent import close_http_client, flush_agent_checkpoints
+
+    await flush_agent_checkpoints()
+    await close_http_client()
 
 
 # ============================================================================
@@ -134,6 +147,11 @@ templates_path = Path(__file__).parent / "templates"
 templates_path.mkdir(exist_ok=True)
 templates = Jinja2Templates(directory=str(templates_path))
 
+# Share compiled template bytecode across worker processes. With no directory,
+# Jinja uses a per-user temp dir it creates with 0700 and checks the owner of.
+templates.env.bytecode_cache = FileSystemBytecodeCache()
+templates.env.auto_reload = TEMPLATE_AUTO_RELOAD
+
 
 # ============================================================================
 # Health Check Endpoint
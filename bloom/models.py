@@ -100,8 +100,8 @@ class SessionState(BaseModel):
     """
 
     subtopic_id: int = Field(..., description="Current subtopic being studied")
-    current_state: Literal["exposition", "questioning", "evaluation", "diagnosis", "socratic"] = (
-        Field(default="exposition", description="Current tutoring state node")
+    current_state: Literal["exposition", "questioning", "evaluation", "socratic"] = Field(
+        default="exposition", description="Current tutoring state node"
     )
     messages: list[SessionStateMessageDict] = Field(
         default_factory=list, description="Chat history (role, content pairs)"
@@ -163,9 +163,7 @@ class CalculatorRequest(BaseModel):
 # Database Helper Functions
 # ============================================================================
 
-from datetime import datetime, timezone
-
-from bloom.database import get_connection
+from bloom.database import get_connection, iso_now
 
 
 # TypedDict definitions for database return types
@@ -246,7 +244,7 @@ def create_session(subtopic_id: int, db_path: str = "bloom.db") -> int:
     conn = get_connection(db_path)
     cursor = conn.cursor()
 
-    now = datetime.now(timezone.utc).isoformat()
+    now = iso_now()
     cursor.execute(
         """
         INSERT INTO sessions (subtopic_id, state, created_at, updated_at)
@@ -340,7 +338,7 @@ def update_session(
 
     # Always update timestamp
     updates.append("updated_at = ?")
-    params.append(datetime.now(timezone.utc).isoformat())
+    params.append(iso_now())
 
     params.append(session_id)
 
@@ -377,7 +375,7 @@ def add_message(session_id: int, role: str, content: str, db_path: str = "bloom.
         INSERT INTO messages (session_id, role, content, timestamp)
         VALUES (?, ?, ?, ?)
     """,
-        (session_id, role, content, datetime.now(timezone.utc).isoformat()),
+        (session_id, role, content, iso_now()),
     )
 
     message_id = cursor.lastrowid
@@ -390,12 +388,15 @@ def add_message(session_id: int, role: str, content: str, db_path: str = "bloom.
     return message_id
 
 
-def get_messages_for_session(session_id: int, db_path: str = "bloom.db") -> list[MessageDict]:
-    """Get all messages for a session, ordered by timestamp.
+def get_messages_for_session(
+    session_id: int, db_path: str = "bloom.db", limit: Optional[int] = None
+) -> list[MessageDict]:
+    """Get messages for a session, ordered by timestamp.
 
     Args:
         session_id: Session ID
         db_path: Path to database file
+        limit: Return only the most recent limit messages (None for all)
 
     Returns:
         List of message dicts with role, content, timestamp
@@ -403,14 +404,21 @@ def get_messages_for_session(session_id: int, db_path: str = "bloom.db") -> list
     conn = get_connection(db_path)
     cursor = conn.cursor()
 
+    # Timestamps have second resolution, so id breaks ties in insertion order.
+    # The newest messages are selected first; LIMIT -1 means no limit in SQLite.
     cursor.execute(
         """
         SELECT id, role, content, timestamp
-        FROM messages
-        WHERE session_id = ?
-        ORDER BY timestamp ASC
+        FROM (
+            SELECT id, role, content, timestamp
+            FROM messages
+            WHERE session_id = ?
+            ORDER BY timestamp DESC, id DESC
+            LIMIT ?
+        )
+        ORDER BY timestamp ASC, id ASC
     """,
-        (session_id,),
+        (session_id, -1 if limit is None else limit),
     )
 
     messages: list[MessageDict] = []
@@ -432,6 +440,34 @@ def get_messages_for_session(session_id: int, db_path: str = "bloom.db") -> list
 # ============================================================================
 
 
+# Upsert used by update_progress and commit_turn
+_PROGRESS_UPSERT_SQL = """
+    INSERT INTO progress (subtopic_id, questions_attempted, questions_correct, is_complete, last_accessed)
+    VALUES (?, 1, ?, 0, ?)
+    ON CONFLICT(subtopic_id) DO UPDATE SET
+        questions_attempted = questions_attempted + 1,
+        questions_correct = questions_correct + ?,
+        is_complete = CASE WHEN questions_correct + ? >= ? THEN 1 ELSE 0 END,
+        last_accessed = ?
+"""
+
+
+def _progress_upsert_params(
+    subtopic_id: int, is_correct: bool, completion_threshold: int, now: str
+) -> tuple:
+    """Build the parameter tuple for _PROGRESS_UPSERT_SQL."""
+    correct_increment = 1 if is_correct else 0
+    return (
+        subtopic_id,
+        correct_increment,
+        now,
+        correct_increment,
+        correct_increment,
+        completion_threshold,
+        now,
+    )
+
+
 def update_progress(
     subtopic_id: int, is_correct: bool, completion_threshold: int = 3, db_path: str = "bloom.db"
 ) -> ProgressUpdateDict:
@@ -449,29 +485,12 @@ def update_progress(
     conn = get_connection(db_path)
     cursor = conn.cursor()
 
-    now = datetime.now(timezone.utc).isoformat()
-    correct_increment = 1 if is_correct else 0
+    now = iso_now()
 
     # Insert or update progress
     cursor.execute(
-        """
-        INSERT INTO progress (subtopic_id, questions_attempted, questions_correct, is_complete, last_accessed)
-        VALUES (?, 1, ?, 0, ?)
-        ON CONFLICT(subtopic_id) DO UPDATE SET
-            questions_attempted = questions_attempted + 1,
-            questions_correct = questions_correct + ?,
-            is_complete = CASE WHEN questions_correct + ? >= ? THEN 1 ELSE 0 END,
-            last_accessed = ?
-    """,
-        (
-            subtopic_id,
-            correct_increment,
-            now,
-            correct_increment,
-            correct_increment,
-            completion_threshold,
-            now,
-        ),
+        _PROGRESS_UPSERT_SQL,
+        _progress_upsert_params(subtopic_id, is_correct, completion_threshold, now),
     )
 
     # Fetch updated progress
@@ -495,6 +514,70 @@ def update_progress(
     }
 
 
+def commit_turn(
+    session_id: int,
+    subtopic_id: int,
+    messages: list[dict],
+    questions_attempted: int,
+    questions_correct: int,
+    question_result: Optional[bool] = None,
+    completion_threshold: int = 3,
+    db_path: str = "bloom.db",
+) -> None:
+    """Persist everything a chat turn produced in a single transaction.
+
+    Replaces separate add_message / update_session / update_progress calls
+    (one connection and commit each) with one write-lock acquisition per turn.
+
+    Args:
+        session_id: Session ID
+        subtopic_id: Subtopic the session is studying
+        messages: New messages to append (dicts with role and content)
+        questions_attempted: New attempted count for the session
+        questions_correct: New correct count for the session
+        question_result: Correctness of the question answered this turn,
+            or None if no question was answered (progress left untouched)
+        completion_threshold: Number of correct answers needed for completion
+        db_path: Path to database file
+    """
+    conn = get_connection(db_path)
+    cursor = conn.cursor()
+
+    now = iso_now()
+
+    try:
+        if messages:
+            cursor.executemany(
+                """
+                INSERT INTO messages (session_id, role, content, timestamp)
+                VALUES (?, ?, ?, ?)
+            """,
+                [(session_id, msg["role"], msg["content"], now) for msg in messages],
+            )
+
+        cursor.execute(
+            """
+            UPDATE sessions
+            SET questions_attempted = ?, questions_correct = ?, updated_at = ?
+            WHERE id = ?
+        """,
+            (questions_attempted, questions_correct, now, session_id),
+        )
+
+        if question_result is not None:
+            cursor.execute(
+                _PROGRESS_UPSERT_SQL,
+                _progress_upsert_params(subtopic_id, question_result, completion_threshold, now),
+            )
+
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
 def get_progress_for_subtopic(subtopic_id: int, db_path: str = "bloom.db") -> Optional[ProgressDict]:
     """Get progress data for a specific subtopic.
 
@@ -531,6 +614,38 @@ def get_progress_for_subtopic(subtopic_id: int, db_path: str = "bloom.db") -> Op
     return None
 
 
+def get_upcoming_subtopics(
+    subtopic_id: int, limit: int, db_path: str = "bloom.db"
+) -> list[tuple[int, str]]:
+    """Get the subtopics that follow a subtopic in syllabus order.
+
+    Args:
+        subtopic_id: Subtopic the student is currently studying
+        limit: Maximum number of subtopics to return
+        db_path: Path to database file
+
+    Returns:
+        List of (subtopic_id, subtopic_name) tuples, in syllabus order
+    """
+    conn = get_connection(db_path)
+    cursor = conn.cursor()
+
+    cursor.execute(
+        """
+        SELECT st.id, st.name
+        FROM subtopics st
+        WHERE (st.topic_id, st.id) > (SELECT topic_id, id FROM subtopics WHERE id = ?)
+        ORDER BY st.topic_id, st.id
+        LIMIT ?
+    """,
+        (subtopic_id, limit),
+    )
+
+    upcoming = [(row["id"], row["name"]) for row in cursor.fetchall()]
+    conn.close()
+    return upcoming
+
+
 def aggregate_topic_progress(db_path: str = "bloom.db") -> list[TopicProgressDict]:
     """Aggregate progress statistics at the topic level.
 
@@ -7,21 +7,40 @@ This module handles:
 - Error handling and retry logic
 """
 
+import asyncio
 import logging
-from datetime import datetime
+from collections import deque
 
+import orjson
 from fastapi import APIRouter, Form, HTTPException, Request
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, Response, StreamingResponse
 
-from bloom.main import DATABASE_PATH, templates
+from bloom.database import get_cached_image, get_connection, iso_now
+from bloom.main import COMPLETION_THRESHOLD, DATABASE_PATH, templates
 from bloom.models import (
     add_message,
+    aggregate_topic_progress,
+    commit_turn,
     create_session,
     get_messages_for_session,
     get_session,
     update_session,
 )
-from bloom.tutor_agent import TutorState, load_agent_checkpoint, save_agent_checkpoint
+from bloom.tutor_agent import (
+    RECENT_CONTEXT_SIZE,
+    TutorState,
+    append_message,
+    evaluation_node,
+    exposition_node,
+    is_image_generation_pending,
+    load_agent_checkpoint,
+    questioning_node,
+    queue_agent_checkpoint,
+    route_next,
+    schedule_exposition_prewarm,
+    socratic_node,
+    token_emitter,
+)
 
 # pylint: disable=logging-fstring-interpolation
 logger = logging.getLogger("bloom.routes")
@@ -29,6 +48,9 @@ logger = logging.getLogger("bloom.routes")
 
 router = APIRouter(prefix="", tags=["student"])
 
+# Chat turns whose client disconnected, kept referenced until they finish persisting
+_abandoned_turns: set[asyncio.Task] = set()
+
 
 # ============================================================================
 # Homepage & Syllabus Navigation
@@ -38,8 +60,6 @@ router = APIRouter(prefix="", tags=["student"])
 @router.get("/", response_class=HTMLResponse)
 async def homepage(request: Request):
     """Homepage with syllabus navigation and session resumption check."""
-    from bloom.database import get_connection
-
     # Check for active session
     conn = get_connection(DATABASE_PATH)
     cursor = conn.cursor()
@@ -102,8 +122,6 @@ async def homepage(request: Request):
 @router.get("/syllabus", response_class=HTMLResponse)
 async def get_syllabus(request: Request):
     """Get full syllabus with progress data (HTML for htmx)."""
-    from bloom.database import get_connection
-
     conn = get_connection(DATABASE_PATH)
     cursor = conn.cursor()
 
@@ -162,8 +180,6 @@ async def get_syllabus(request: Request):
 @router.get("/progress")
 async def get_progress():
     """Get progress summary for all topics."""
-    from bloom.models import aggregate_topic_progress
-
     topic_progress = aggregate_topic_progress(DATABASE_PATH)
 
     return {"topic_progress": topic_progress}
@@ -206,12 +222,16 @@ async def start_session(
             "calculator_history": [],
             "last_question": None,
             "last_evaluation": None,
+            "recent_context_lines": deque(maxlen=RECENT_CONTEXT_SIZE),
             "hints_given": 0,
         }
 
         # Save initial checkpoint (empty state, exposition will generate on page load)
         logger.debug("Saving initial agent checkpoint")
-        save_agent_checkpoint(session_id, initial_state, DATABASE_PATH)
+        queue_agent_checkpoint(session_id, initial_state, DATABASE_PATH)
+
+        # Generate the next subtopics' expositions in the background
+        schedule_exposition_prewarm(subtopic_id)
 
         logger.info(
             f"Session {session_id} initialized successfully (exposition will generate on page load)"
@@ -251,13 +271,11 @@ async def resume_session(request: Request, session_id: int = Form(...)):
             raise HTTPException(status_code=400, detail="Session is not active")
 
         # Load agent checkpoint
-        state = load_agent_checkpoint(session_id, DATABASE_PATH)
+        state = await asyncio.to_thread(load_agent_checkpoint, session_id, DATABASE_PATH)
         if not state:
             raise HTTPException(status_code=500, detail="Agent state not found")
 
         # Get subtopic name
-        from bloom.database import get_connection
-
         conn = get_connection(DATABASE_PATH)
         cursor = conn.cursor()
 
@@ -305,8 +323,6 @@ async def abandon_session(session_id: int = Form(None)):
     If session_id is None/not provided, abandons ALL active sessions.
     Marks session(s) as abandoned without deleting data.
     """
-    from bloom.database import get_connection
-
     try:
         conn = get_connection(DATABASE_PATH)
         cursor = conn.cursor()
@@ -335,7 +351,7 @@ async def abandon_session(session_id: int = Form(None)):
                 SET state = 'abandoned', updated_at = ?
                 WHERE state = 'active'
             """,
-                (datetime.utcnow().isoformat(),),
+                (iso_now(),),
             )
 
             abandoned_count = cursor.rowcount
@@ -372,7 +388,7 @@ async def get_chat(request: Request, session_id: int):
         raise HTTPException(status_code=404, detail="Session not found")
 
     # Load agent state for calculator visibility
-    state = load_agent_checkpoint(session_id, DATABASE_PATH)
+    state = await asyncio.to_thread(load_agent_checkpoint, session_id, DATABASE_PATH)
     calculator_visible = state.get("calculator_visible", False) if state else False
 
     # Get subtopic name (we'll need to query this - simplified for now)
@@ -393,7 +409,8 @@ async def get_chat(request: Request, session_id: int):
 async def get_chat_messages(request: Request, session_id: int):
     """Return message history as HTML fragments for htmx.
 
-    If session has no messages yet, triggers initial exposition generation.
+    If session has no messages yet, returns 204 with an ``HX-Trigger: start-lesson``
+    header instead; the page then streams the initial exposition from /chat/start.
     """
 
     messages = get_messages_for_session(session_id, DATABASE_PATH)
@@ -402,28 +419,11 @@ async def get_chat_messages(request: Request, session_id: int):
     session = get_session(session_id, DATABASE_PATH)
     subtopic_id = session.get("subtopic_id") if session else None
 
-    # If no messages yet, this is initial load - generate exposition async
+    # If no messages yet, this is initial load - leave the loading indicator in place
+    # and let the client stream the exposition
     if not messages and session:
-        logger.info(f"Initial load for session {session_id}, generating exposition")
-
-        # Load checkpoint to get agent state
-        from bloom.tutor_agent import exposition_node, load_agent_checkpoint, save_agent_checkpoint
-
-        state = load_agent_checkpoint(session_id, DATABASE_PATH)
-
-        if state:
-            # Generate initial exposition
-            state = await exposition_node(state)
-
-            # Save messages to database
-            for msg in state["messages"]:
-                add_message(session_id, msg["role"], msg["content"], DATABASE_PATH)
-
-            # Update checkpoint
-            save_agent_checkpoint(session_id, state, DATABASE_PATH)
-
-            # Update messages list
-            messages = get_messages_for_session(session_id, DATABASE_PATH)
+        logger.info(f"Initial load for session {session_id}, starting streamed exposition")
+        return Response(status_code=204, headers={"HX-Trigger": "start-lesson"})
 
     # Render messages as HTML
     html_parts = []
@@ -450,73 +450,257 @@ async def get_chat_messages(request: Request, session_id: int):
 # ============================================================================
 
 
-@router.post("/chat/message", response_class=HTMLResponse)
+def _sse_event(html: str, event: str = "message") -> str:
+    """Frame an HTML fragment as a Server-Sent Event.
+
+    Args:
+        html: Rendered HTML fragment
+        event: SSE event name
+
+    Returns:
+        SSE-formatted event string (one ``data:`` line per HTML line)
+    """
+    data = "\n".join(f"data: {line}" for line in html.splitlines() or [""])
+    return f"event: {event}\n{data}\n\n"
+
+
+def _start_node(node_func, state: dict) -> tuple[asyncio.Task, asyncio.Queue]:
+    """Run an agent node as a task whose streamed LLM tokens go to a queue.
+
+    Args:
+        node_func: Async node function
+        state: Agent state passed to the node
+
+    Returns:
+        Tuple of (node task, queue of streamed text chunks)
+    """
+    tokens: asyncio.Queue = asyncio.Queue()
+    # The task copies the current context, so the emitter only applies to this node
+    reset_token = token_emitter.set(tokens.put_nowait)
+    try:
+        task = asyncio.create_task(node_func(state))
+    finally:
+        token_emitter.reset(reset_token)
+    return task, tokens
+
+
+async def _stream_node_tokens(task: asyncio.Task, tokens: asyncio.Queue):
+    """Yield streamed tokens as ``token`` SSE events until the node task finishes.
+
+    Each event's data is the JSON-encoded text chunk (keeps newlines intact).
+    """
+    while True:
+        next_token = asyncio.ensure_future(tokens.get())
+        done, _ = await asyncio.wait({task, next_token}, return_when=asyncio.FIRST_COMPLETED)
+        if next_token in done:
+            yield _sse_event(orjson.dumps(next_token.result()).decode(), event="token")
+            continue
+        next_token.cancel()
+        break
+
+    while not tokens.empty():
+        yield _sse_event(orjson.dumps(tokens.get_nowait()).decode(), event="token")
+
+
+def _render_message(request: Request, msg: dict, subtopic_id: int | None = None) -> str:
+    """Render a single chat message bubble."""
+    return templates.get_template("components/message.html").render(
+        message=msg,
+        subtopic_id=subtopic_id,
+        request=request,
+    )
+
+
+@router.post("/chat/message")
 async def post_chat_message(
     request: Request,
     session_id: int = Form(...),
     message: str = Form(...),
 ):
-    """Process student message and generate tutor response via agent."""
+    """Process student message and stream tutor responses via Server-Sent Events.
+
+    Each message is flushed as soon as the node that produced it completes, so the
+    student sees their own message and the first tutor reply without waiting for
+    the whole graph run.
+    """
 
     logger.info(f"Received message for session {session_id}: '{message[:50]}...'")
 
+    return StreamingResponse(
+        _stream_chat_turn(request, session_id, message),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def _stream_chat_turn(request: Request, session_id: int, message: str):
+    """Yield the SSE events of one chat turn (see _stream_turn)."""
+    return _stream_turn(
+        session_id, lambda emit: _run_chat_turn(request, session_id, message, emit)
+    )
+
+
+async def _stream_turn(session_id: int, run_turn):
+    """Yield the SSE events of a turn running as its own task.
+
+    The generator only observes the turn. If the client disconnects, Starlette
+    cancels the generator; the turn is then cancelled too, which stops the node
+    in flight but still persists everything the completed nodes produced.
+
+    Args:
+        session_id: Session ID (for logging)
+        run_turn: Callable taking an emit callable and returning the turn coroutine
+    """
+    events: asyncio.Queue = asyncio.Queue()
+    turn = asyncio.create_task(run_turn(events.put_nowait))
+
+    try:
+        while (event := await events.get()) is not None:
+            yield event
+    finally:
+        if not turn.done():
+            logger.info(f"Client left session {session_id} mid-turn, abandoning turn")
+            turn.cancel()
+            # Keep a reference until the cancelled turn has finished persisting
+            _abandoned_turns.add(turn)
+            turn.add_done_callback(_abandoned_turns.discard)
+
+
+@router.post("/chat/start")
+async def start_chat(request: Request, session_id: int = Form(...)):
+    """Stream the initial exposition of a session via Server-Sent Events.
+
+    Requested by the chat page when /chat/messages finds no messages, so the
+    first explanation streams token by token like every later reply.
+    """
+
+    logger.info(f"Starting session {session_id}")
+
+    return StreamingResponse(
+        _stream_turn(
+            session_id,
+            lambda emit: _run_current_node_turn(request, session_id, emit, initial=True),
+        ),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def _copy_state(state: dict) -> dict:
+    """Copy agent state so a cancelled node cannot leave it half-updated.
+
+    Nodes mutate state in place; only the containers they append to need copying.
+    """
+    state = dict(state)
+    state["messages"] = list(state["messages"])
+    if "recent_context_lines" in state:
+        state["recent_context_lines"] = state["recent_context_lines"].copy()
+    return state
+
+
+# Map node names to functions
+_NODE_FUNCS = {
+    "exposition": exposition_node,
+    "questioning": questioning_node,
+    "evaluation": evaluation_node,
+    "socratic": socratic_node,
+}
+
+
+async def _run_node(node_func, state: dict, emit) -> dict:
+    """Run one node on a copy of state, emitting its streamed tokens.
+
+    The node task is cancelled if this coroutine is (e.g. the turn was abandoned).
+    """
+    task, tokens = _start_node(node_func, _copy_state(state))
+    try:
+        async for event in _stream_node_tokens(task, tokens):
+            emit(event)
+    finally:
+        task.cancel()  # No-op once the node has finished
+    return task.result()
+
+
+async def _persist_turn(session: dict, session_id: int, state: dict, existing_db_count: int):
+    """Save a turn's tutor messages, session counters, progress and checkpoint."""
+    # Update progress after evaluation (FR-008: 3-5 correct = complete)
+    # Check if a question was evaluated in this turn
+    prev_attempted = session["questions_attempted"]
+    new_attempted = state["questions_attempted"]
+    question_result = None
+
+    if new_attempted > prev_attempted:
+        # A question was evaluated in this turn
+        prev_correct = session["questions_correct"]
+        new_correct = state["questions_correct"]
+        question_result = new_correct > prev_correct
+
+        logger.info(
+            f"Question evaluated: correct={question_result}, "
+            f"total={new_correct}/{new_attempted}"
+        )
+
+    # Save new tutor messages, session counters and progress in one transaction
+    # Get messages added since the original count (includes student message + tutor responses)
+    new_messages = state["messages"][existing_db_count:]
+
+    await asyncio.to_thread(
+        commit_turn,
+        session_id,
+        session["subtopic_id"],
+        [msg for msg in new_messages if msg["role"] == "tutor"],  # Student message already added
+        questions_attempted=state["questions_attempted"],
+        questions_correct=state["questions_correct"],
+        question_result=question_result,
+        completion_threshold=COMPLETION_THRESHOLD,
+        db_path=DATABASE_PATH,
+    )
+
+    # Save updated agent checkpoint (written in the background)
+    queue_agent_checkpoint(session_id, state, DATABASE_PATH)
+
+
+async def _run_chat_turn(request: Request, session_id: int, message: str, emit):
+    """Run one agent turn, emitting each new message as an SSE event.
+
+    Args:
+        request: Incoming request (for template rendering)
+        session_id: Session ID
+        message: Student message
+        emit: Callable receiving each SSE event string; receives None when the turn ends
+    """
+    session = None
+    state = None
+    existing_db_count = 0
+
     try:
         # Get session
-        session = get_session(session_id, DATABASE_PATH)
+        session = await asyncio.to_thread(get_session, session_id, DATABASE_PATH)
         if not session:
             logger.error(f"Session {session_id} not found")
             raise HTTPException(status_code=404, detail="Session not found")
 
         # Load agent state
-        state = load_agent_checkpoint(session_id, DATABASE_PATH)
-        if not state:
+        loaded_state = await asyncio.to_thread(load_agent_checkpoint, session_id, DATABASE_PATH)
+        if not loaded_state:
             logger.error(f"Agent state not found for session {session_id}")
             raise HTTPException(status_code=500, detail="Agent state not found")
 
-        # Get message count BEFORE adding student message (for rendering later)
-        existing_db_count = len(get_messages_for_session(session_id, DATABASE_PATH))
+        # Get message count BEFORE adding student message (checkpoint history mirrors the DB)
+        existing_db_count = len(loaded_state["messages"])
 
         # Add student message to state and database
-        state["messages"].append(
-            {"role": "student", "content": message, "timestamp": datetime.utcnow().isoformat()}
-        )
-        add_message(session_id, "student", message, DATABASE_PATH)
+        append_message(loaded_state, "student", message)
+        state = loaded_state
+        await asyncio.to_thread(add_message, session_id, "student", message, DATABASE_PATH)
+
+        # Flush the student's own message immediately
+        emitted = len(state["messages"])
+        emit(_sse_event(_render_message(request, state["messages"][-1])))
 
         # Update last_student_answer for evaluation
         state["last_student_answer"] = message
 
-        # Import nodes and routing functions
-        from bloom.tutor_agent import (
-            diagnosis_node,
-            evaluation_node,
-            exposition_node,
-            questioning_node,
-            route_from_diagnosis,
-            route_from_evaluation,
-            route_from_exposition,
-            route_from_questioning,
-            route_from_socratic,
-            socratic_node,
-        )
-
-        # Map node names to functions
-        node_map = {
-            "exposition": exposition_node,
-            "questioning": questioning_node,
-            "evaluation": evaluation_node,
-            "diagnosis": diagnosis_node,
-            "socratic": socratic_node,
-        }
-
-        # Map node names to routing functions
-        route_map = {
-            "exposition": route_from_exposition,
-            "questioning": route_from_questioning,
-            "evaluation": route_from_evaluation,
-            "diagnosis": route_from_diagnosis,
-            "socratic": route_from_socratic,
-        }
-
         current_state = state["current_state"]
         logger.info("Current agent state: %s (invoking graph from this node)", current_state)
 
@@ -524,23 +708,23 @@ async def post_chat_message(
         # If so, skip re-running exposition and go straight to questioning
         # If student is asking a follow-up question, run exposition to answer it
         if current_state == "exposition":
-            route_func = route_map.get("exposition")
-            if route_func:
-                next_node = route_func(state)
-                logger.info(f"Routing decision from exposition: exposition → {next_node}")
-
-                if next_node == "questioning":
-                    # Student requested question, go straight to questioning
-                    state["current_state"] = "questioning"
-                    current_state = "questioning"
-                elif next_node == "END":
-                    # Student asked a follow-up question, run exposition to answer it
-                    logger.info(
-                        "Student asked follow-up question in exposition, generating response"
-                    )
-                    state = await exposition_node(state)
-                    # Stay in exposition state
-                    current_state = "exposition"
+            next_node = route_next("exposition", state)
+            logger.info(f"Routing decision from exposition: exposition → {next_node}")
+
+            if next_node == "questioning":
+                # Student requested question, go straight to questioning
+                state["current_state"] = "questioning"
+                current_state = "questioning"
+            elif next_node == "END":
+                # Student asked a follow-up question, run exposition to answer it
+                logger.info("Student asked follow-up question in exposition, generating response")
+                state = await _run_node(exposition_node, state, emit)
+                # Stay in exposition state
+                current_state = "exposition"
+
+                for msg in state["messages"][emitted:]:
+                    emit(_sse_event(_render_message(request, msg)))
+                emitted = len(state["messages"])
 
         # For questioning state, student has submitted an answer - move to evaluation
         elif current_state == "questioning":
@@ -557,19 +741,22 @@ async def post_chat_message(
             # Get current node
             node_name = state["current_state"]
 
-            if node_name not in node_map:
+            if node_name not in _NODE_FUNCS:
                 logger.error(f"Unknown node: {node_name}")
                 break
 
             # Execute current node
-            node_func = node_map[node_name]
             logger.info(f"Executing node: {node_name}")
-            state = await node_func(state)
+            state = await _run_node(_NODE_FUNCS[node_name], state, emit)
+
+            # Flush this node's messages before running the next one
+            for msg in state["messages"][emitted:]:
+                emit(_sse_event(_render_message(request, msg)))
+            emitted = len(state["messages"])
 
-            # Determine next node using routing function
-            route_func = route_map.get(node_name)
-            if route_func:
-                next_node = route_func(state)
+            # Determine next node using the precomputed router table
+            next_node = route_next(node_name, state)
+            if next_node:
                 logger.info(f"Routing decision: {node_name} → {next_node}")
 
                 if next_node == "END" or next_node == "__end__":
@@ -588,72 +775,99 @@ async def post_chat_message(
         if iteration >= max_iterations:
             logger.error("Graph execution hit max iterations - possible infinite loop")
 
-        # Update session counters
-        update_session(
-            session_id,
-            questions_attempted=state["questions_attempted"],
-            questions_correct=state["questions_correct"],
-            db_path=DATABASE_PATH,
-        )
+        await _persist_turn(session, session_id, state, existing_db_count)
 
-        # Update progress after evaluation (FR-008: 3-5 correct = complete)
-        # Check if a question was evaluated in this turn
-        from bloom.main import COMPLETION_THRESHOLD
-        from bloom.models import update_progress
+    except asyncio.CancelledError:
+        # Turn abandoned: keep the DB and checkpoint in step with the completed nodes
+        if state is not None:
+            await _persist_turn(session, session_id, state, existing_db_count)
+        raise
 
-        prev_attempted = session["questions_attempted"]
-        new_attempted = state["questions_attempted"]
+    except Exception as e:
+        # Stream error message as HTML
+        error_msg = {
+            "role": "tutor",
+            "content": f"I'm having trouble right now. Please try again. (Error: {str(e)})",
+            "timestamp": iso_now(),
+        }
 
-        if new_attempted > prev_attempted:
-            # A question was evaluated in this turn
-            prev_correct = session["questions_correct"]
-            new_correct = state["questions_correct"]
-            is_correct = new_correct > prev_correct
+        emit(_sse_event(_render_message(request, error_msg), event="error"))
 
-            logger.info(
-                f"Question evaluated: correct={is_correct}, total={new_correct}/{new_attempted}"
-            )
+    finally:
+        emit(_sse_event("", event="done"))
+        emit(None)
 
-            update_progress(session["subtopic_id"], is_correct, COMPLETION_THRESHOLD, DATABASE_PATH)
 
-        # Save new tutor messages to database
-        # Get messages added since the original count (includes student message + tutor responses)
-        new_messages = state["messages"][existing_db_count:]
+async def _run_current_node_turn(request: Request, session_id: int, emit, initial: bool = False):
+    """Run the checkpoint's current node, emitting its tokens and messages as SSE events.
 
-        for msg in new_messages:
-            if msg["role"] == "tutor":  # Student message already added
-                add_message(session_id, msg["role"], msg["content"], DATABASE_PATH)
+    Used for the initial exposition and for retrying a failed LLM call (FR-018).
+
+    Args:
+        request: Incoming request (for template rendering)
+        session_id: Session ID
+        emit: Callable receiving each SSE event string; receives None when the turn ends
+        initial: Starting the session; if it already has messages (e.g. opened in
+            another tab), they are sent instead of running the node again
+    """
+    session = None
+    state = None
+    existing_db_count = 0
 
-        # Save updated agent checkpoint
-        save_agent_checkpoint(session_id, state, DATABASE_PATH)
+    try:
+        # Get session
+        session = await asyncio.to_thread(get_session, session_id, DATABASE_PATH)
+        if not session:
+            logger.error(f"Session {session_id} not found")
+            raise HTTPException(status_code=404, detail="Session not found")
 
-        # Return ALL new messages (student + tutor) as HTML
-        # Note: Don't show image container for these messages - image only shows on initial exposition
-        html_parts = []
+        # Load agent state
+        loaded_state = await asyncio.to_thread(load_agent_checkpoint, session_id, DATABASE_PATH)
+        if not loaded_state:
+            logger.error(f"Agent state not found for session {session_id}")
+            raise HTTPException(status_code=500, detail="Agent state not found")
+
+        existing_db_count = len(loaded_state["messages"])
+        if initial and existing_db_count:
+            # Already started elsewhere - send what the session has
+            earlier_messages = []
+            new_messages = loaded_state["messages"]
+        else:
+            node_name = loaded_state["current_state"]
+            if node_name not in _NODE_FUNCS:
+                raise HTTPException(status_code=500, detail=f"Unknown node: {node_name}")
+
+            logger.info(f"Running node {node_name} for session {session_id}")
+            state = await _run_node(_NODE_FUNCS[node_name], loaded_state, emit)
+            earlier_messages = loaded_state["messages"]
+            new_messages = state["messages"][existing_db_count:]
+
+        # Only the first tutor message of the session (the exposition) shows the image
+        show_image = not any(msg["role"] == "tutor" for msg in earlier_messages)
         for msg in new_messages:
-            html_parts.append(
-                templates.get_template("components/message.html").render(
-                    message=msg,
-                    subtopic_id=None,  # Never show image on subsequent messages
-                    request=request,
-                )
-            )
+            image = session["subtopic_id"] if show_image and msg["role"] == "tutor" else None
+            if msg["role"] == "tutor":
+                show_image = False
+            emit(_sse_event(_render_message(request, msg, image)))
 
-        return HTMLResponse(content="".join(html_parts))
+        # A cancelled node leaves nothing to persist; the checkpoint still holds
+        # the state before it, so a retry re-runs it
+        if state is not None:
+            await _persist_turn(session, session_id, state, existing_db_count)
 
     except Exception as e:
-        # Return error message as HTML
+        # Stream error message as HTML
         error_msg = {
             "role": "tutor",
             "content": f"I'm having trouble right now. Please try again. (Error: {str(e)})",
-            "timestamp": datetime.utcnow().isoformat(),
+            "timestamp": iso_now(),
         }
 
-        return templates.get_template("components/message.html").render(
-            message=error_msg,
-            subtopic_id=None,
-            request=request,
-        )
+        emit(_sse_event(_render_message(request, error_msg), event="error"))
+
+    finally:
+        emit(_sse_event("", event="done"))
+        emit(None)
 
 
 # ============================================================================
@@ -677,16 +891,15 @@ async def serve_image(subtopic_id: int):
     Raises:
         HTTPException: 404 if image not found or corrupted
     """
-    from fastapi.responses import Response
-
-    from bloom.database import get_cached_image
-
     try:
         # Retrieve cached image
         cached_image = get_cached_image(subtopic_id, DATABASE_PATH)
 
         if cached_image is None:
-            # No image found - return 404 for graceful degradation
+            # Still generating or not found - 404 either way (frontend keeps polling)
+            if is_image_generation_pending(subtopic_id):
+                logger.debug(f"Image still generating for subtopic {subtopic_id}")
+                raise HTTPException(status_code=404, detail="Image generating")
             logger.debug(f"Image not found for subtopic {subtopic_id}")
             raise HTTPException(status_code=404, detail="Image not found")
 
@@ -730,77 +943,17 @@ async def serve_image(subtopic_id: int):
 # ============================================================================
 
 
-@router.post("/chat/retry", response_class=HTMLResponse)
+@router.post("/chat/retry")
 async def retry_last_message(request: Request, session_id: int = Form(...)):
-    """Retry last LLM call if it failed (FR-018).
+    """Retry last LLM call if it failed (FR-018), streaming the reply via Server-Sent Events.
 
-    Re-runs the agent from the last checkpoint with the same input.
+    Re-runs the agent's current node from the last checkpoint.
     """
 
-    try:
-        # Load agent state
-        state = load_agent_checkpoint(session_id, DATABASE_PATH)
-        if not state:
-            raise HTTPException(status_code=500, detail="No state to retry")
-
-        # Re-run the current node
-        from bloom.tutor_agent import (
-            diagnosis_node,
-            evaluation_node,
-            exposition_node,
-            questioning_node,
-            socratic_node,
-        )
+    logger.info(f"Retrying last message for session {session_id}")
 
-        current_state = state["current_state"]
-
-        if current_state == "exposition":
-            state = await exposition_node(state)
-        elif current_state == "questioning":
-            state = await questioning_node(state)
-        elif current_state == "evaluation":
-            state = await evaluation_node(state)
-        elif current_state == "diagnosis":
-            state = await diagnosis_node(state)
-        elif current_state == "socratic":
-            state = await socratic_node(state)
-
-        # Save new messages
-        existing_count = len(get_messages_for_session(session_id, DATABASE_PATH))
-        new_messages = state["messages"][existing_count:]
-
-        for msg in new_messages:
-            add_message(session_id, msg["role"], msg["content"], DATABASE_PATH)
-
-        # Save checkpoint
-        save_agent_checkpoint(session_id, state, DATABASE_PATH)
-
-        # Return new messages as HTML
-        # Get subtopic_id for image loading (spec 003)
-        session = get_session(session_id, DATABASE_PATH)
-        subtopic_id = session.get("subtopic_id") if session else None
-
-        html_parts = []
-        for msg in new_messages:
-            html_parts.append(
-                templates.get_template("components/message.html").render(
-                    message=msg,
-                    subtopic_id=subtopic_id,
-                    request=request,
-                )
-            )
-
-        return HTMLResponse(content="".join(html_parts))
-
-    except Exception as e:
-        error_msg = {
-            "role": "tutor",
-            "content": f"Retry failed: {str(e)}",
-            "timestamp": datetime.utcnow().isoformat(),
-        }
-
-        return templates.get_template("components/message.html").render(
-            message=error_msg,
-            subtopic_id=None,
-            request=request,
-        )
+    return StreamingResponse(
+        _stream_turn(session_id, lambda emit: _run_current_node_turn(request, session_id, emit)),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -1,28 +1,45 @@
 """LangGraph tutoring agent with stateful conversation management.
 
 This module defines the tutoring agent that manages the conversation flow
-through different states: exposition, questioning, evaluation, diagnosis, and socratic.
+through different states: exposition, questioning, evaluation, and socratic.
 """
 
 import asyncio
-import json
+import contextlib
+import functools
+import hashlib
 import logging
 import os
-from datetime import datetime
-from typing import Literal, Optional, TypedDict
-
+import random
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, deque
+from collections.abc import AsyncIterator, Callable
+from contextvars import ContextVar, copy_context
+from string import Template
+from typing import Literal, NotRequired, Optional, TypedDict
+
+import anthropic
+import httpx
+import openai
+import orjson
 from anthropic import AsyncAnthropic
 from dotenv import load_dotenv
 from langgraph.graph import StateGraph
 from openai import AsyncOpenAI
 
 from bloom.database import (
+    cache_generation,
     get_cached_exposition,
     get_cached_image,
+    iso_now,
     save_cached_exposition,
     save_cached_image,
     validate_image_data,
 )
+from bloom.models import get_messages_for_session, get_upcoming_subtopics
 
 # pylint: disable=logging-fstring-interpolation, broad-exception-caught
 
@@ -32,6 +49,16 @@ load_dotenv()
 # LLM Configuration (load directly to avoid circular import with main.py)
 LLM_PROVIDER = os.getenv("LLM_PROVIDER", "openai")
 LLM_MODEL = os.getenv("LLM_MODEL", "gpt-4o-mini")
+# Smaller model for the narrow classification calls (answer evaluation, calculator)
+LLM_FAST_MODEL = os.getenv("LLM_FAST_MODEL", LLM_MODEL)
+# Second model asked to evaluate every answer in parallel (unset disables);
+# an answer is only marked correct if both evaluations agree
+EVAL_CONSENSUS_MODEL = os.getenv("EVAL_CONSENSUS_MODEL")
+EVAL_CONSENSUS_PROVIDER = os.getenv("EVAL_CONSENSUS_PROVIDER", LLM_PROVIDER)
+# Provider and model to retry a call on when the primary provider's circuit is
+# open or its retries are exhausted (unset disables failover)
+LLM_FALLBACK_PROVIDER = os.getenv("LLM_FALLBACK_PROVIDER")
+LLM_FALLBACK_MODEL = os.getenv("LLM_FALLBACK_MODEL")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 ANTHROPIC_API_KEY = os.getenv("ANTHROPIC_API_KEY")
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
@@ -43,11 +70,41 @@ ENABLE_IMAGE_GENERATION = os.getenv("ENABLE_IMAGE_GENERATION", "true").lower() =
 IMAGE_GENERATION_MODEL = os.getenv("IMAGE_GENERATION_MODEL", "gemini-3-pro-image")
 IMAGE_GENERATION_RESOLUTION = os.getenv("IMAGE_GENERATION_RESOLUTION", "2K")
 
+# LLM HTTP connection pool (shared by all provider clients)
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "100"))
+LLM_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", "50"))
+LLM_KEEPALIVE_EXPIRY = float(os.getenv("LLM_KEEPALIVE_EXPIRY", "60"))
+# Maximum concurrent LLM requests across all clients (0 = unlimited); callers
+# beyond it wait for a slot instead of tripping provider rate limits
+LLM_INFLIGHT_LIMIT = int(os.getenv("LLM_INFLIGHT_LIMIT", "20"))
+
+# LLM retry and circuit breaker settings
+LLM_RETRY_MAX_DELAY = float(os.getenv("LLM_RETRY_MAX_DELAY", "30"))
+LLM_CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("LLM_CIRCUIT_FAILURE_THRESHOLD", "5"))
+LLM_CIRCUIT_RESET_SECONDS = float(os.getenv("LLM_CIRCUIT_RESET_SECONDS", "30"))
+
+# LLM micro-batching: coalesce concurrent calls arriving within the window into
+# one request (0 disables batching)
+LLM_BATCH_WINDOW_MS = int(os.getenv("LLM_BATCH_WINDOW_MS", "0"))
+LLM_BATCH_SIZE = int(os.getenv("LLM_BATCH_SIZE", "8"))
+
+# Exposition pre-generation: expositions for this many following subtopics are
+# generated in the background when a session starts (0 disables)
+EXPOSITION_PREWARM_COUNT = int(os.getenv("EXPOSITION_PREWARM_COUNT", "3"))
+# Maximum concurrent LLM calls made by prewarm_expositions
+EXPOSITION_PREWARM_CONCURRENCY = int(os.getenv("EXPOSITION_PREWARM_CONCURRENCY", "10"))
+
+# Ask the LLM to classify questions the local calculator classifier doesn't
+# recognise as numerical (one extra LLM call per such question)
+CALCULATOR_LLM_FALLBACK = os.getenv("CALCULATOR_LLM_FALLBACK", "false").lower() == "true"
+
 # Configure logger for state machine
 logger = logging.getLogger("bloom.tutor_agent")
 
 # Image cache statistics (spec 003 - Phase 4)
 _image_cache_stats = {"hits": 0, "misses": 0, "hit_rate": 0.0}
+# Log the running totals once per this many lookups rather than on every request
+_IMAGE_CACHE_STATS_LOG_INTERVAL = 100
 
 
 def get_image_cache_stats() -> dict:
@@ -62,18 +119,20 @@ def get_image_cache_stats() -> dict:
 def _update_cache_stats(is_hit: bool) -> None:
     """Update cache statistics and calculate hit rate.
 
+    Runs on the event loop without awaiting, so concurrent requests can't
+    interleave the updates and no lock is needed.
+
     Args:
         is_hit: True if cache hit, False if cache miss
     """
-    global _image_cache_stats
     if is_hit:
         _image_cache_stats["hits"] += 1
     else:
         _image_cache_stats["misses"] += 1
 
     total = _image_cache_stats["hits"] + _image_cache_stats["misses"]
-    if total > 0:
-        _image_cache_stats["hit_rate"] = (_image_cache_stats["hits"] / total) * 100
+    _image_cache_stats["hit_rate"] = (_image_cache_stats["hits"] / total) * 100
+    if total % _IMAGE_CACHE_STATS_LOG_INTERVAL == 0:
         logger.info(
             f"📊 Image cache stats: {_image_cache_stats['hits']} hits, "
             f"{_image_cache_stats['misses']} misses, "
@@ -81,6 +140,86 @@ def _update_cache_stats(is_hit: bool) -> None:
         )
 
 
+# In-process LRU caches in front of the SQLite exposition/image caches, keyed by
+# (db_path, subtopic_id). Image entries hold metadata only (no image bytes).
+_MEM_CACHE_SIZE = 256
+_exposition_mem_cache: OrderedDict[tuple[str, int], dict] = OrderedDict()
+_image_meta_mem_cache: OrderedDict[tuple[str, int], dict] = OrderedDict()
+_mem_cache_generation = cache_generation()
+
+
+def _drop_stale_mem_caches() -> None:
+    """Clear both in-process caches if cached content was removed from SQLite.
+
+    Syllabus reloads (subtopic IDs are reused) and cached image deletes bump
+    the database cache generation.
+    """
+    global _mem_cache_generation
+    generation = cache_generation()
+    if generation != _mem_cache_generation:
+        _exposition_mem_cache.clear()
+        _image_meta_mem_cache.clear()
+        _mem_cache_generation = generation
+
+
+def _mem_cache_get(cache: OrderedDict, key: tuple[str, int]) -> Optional[dict]:
+    """Get an entry from an in-process LRU cache, marking it most recently used."""
+    _drop_stale_mem_caches()
+    value = cache.get(key)
+    if value is not None:
+        cache.move_to_end(key)
+    return value
+
+
+def _mem_cache_put(cache: OrderedDict, key: tuple[str, int], value: dict) -> None:
+    """Add an entry to an in-process LRU cache, evicting the least recently used."""
+    _drop_stale_mem_caches()
+    cache[key] = value
+    cache.move_to_end(key)
+    if len(cache) > _MEM_CACHE_SIZE:
+        cache.popitem(last=False)
+
+
+async def _get_exposition(subtopic_id: int) -> Optional[dict]:
+    """Get cached exposition from memory, falling back to SQLite off the event loop.
+
+    Args:
+        subtopic_id: Subtopic ID to look up
+
+    Returns:
+        Cached exposition dict or None if not cached
+    """
+    key = (DATABASE_PATH, subtopic_id)
+    cached = _mem_cache_get(_exposition_mem_cache, key)
+    if cached is None:
+        cached = await asyncio.to_thread(get_cached_exposition, subtopic_id, DATABASE_PATH)
+        if cached:
+            _mem_cache_put(_exposition_mem_cache, key, cached)
+    if cached and cached.get("prompt_version") != EXPOSITION_PROMPT_VERSION:
+        # Generated from an older exposition prompt; regenerate
+        return None
+    return cached
+
+
+async def _get_image_metadata(subtopic_id: int) -> Optional[dict]:
+    """Get cached image metadata from memory, falling back to SQLite off the event loop.
+
+    Args:
+        subtopic_id: Subtopic ID to look up
+
+    Returns:
+        Cached image metadata (without image_data) or None if not cached
+    """
+    key = (DATABASE_PATH, subtopic_id)
+    metadata = _mem_cache_get(_image_meta_mem_cache, key)
+    if metadata is None:
+        cached_image = await asyncio.to_thread(get_cached_image, subtopic_id, DATABASE_PATH)
+        if cached_image:
+            metadata = {k: v for k, v in cached_image.items() if k != "image_data"}
+            _mem_cache_put(_image_meta_mem_cache, key, metadata)
+    return metadata
+
+
 # ============================================================================
 # Agent State Definition
 # ============================================================================
@@ -106,6 +245,7 @@ class EvaluationDict(TypedDict):
 
     correct: bool
     feedback: str
+    socratic_hint: NotRequired[Optional[str]]  # Guiding question for incorrect answers
 
 
 class TutorState(TypedDict):
@@ -116,7 +256,7 @@ class TutorState(TypedDict):
 
     subtopic_id: int
     subtopic_name: str
-    current_state: Literal["exposition", "questioning", "evaluation", "diagnosis", "socratic"]
+    current_state: Literal["exposition", "questioning", "evaluation", "socratic"]
     messages: list[MessageDict]
     questions_correct: int
     questions_attempted: int
@@ -125,6 +265,72 @@ class TutorState(TypedDict):
     calculator_history: list[CalculatorHistoryDict]
     last_question: Optional[str]  # Store the last question asked
     last_evaluation: Optional[EvaluationDict]  # Store evaluation result
+    recent_context_lines: deque[str]  # Pre-formatted "role: content" lines for prompts
+
+
+# Number of recent messages kept pre-formatted for prompt context
+RECENT_CONTEXT_SIZE = 5
+# Longest message text kept in a context line (the initial exposition runs to
+# a few thousand characters; its opening is enough context for later turns)
+RECENT_CONTEXT_MESSAGE_CHARS = 600
+
+_WHITESPACE_RUN = re.compile(r"\s+")
+
+# Messages loaded into agent state on resume. Nodes only read the tail of the
+# conversation, so per-turn load and copy cost stays flat in long sessions.
+STATE_MESSAGE_WINDOW = 20
+
+
+def append_message(state: TutorState, role: str, content: str) -> None:
+    """Append a chat message to state and to the rolling prompt context.
+
+    Args:
+        state: Agent state to update
+        role: 'student' or 'tutor'
+        content: Message text
+    """
+    state["messages"].append({"role": role, "content": content, "timestamp": iso_now()})
+    if "recent_context_lines" not in state:
+        state["recent_context_lines"] = _build_recent_context_lines(state["messages"][:-1])
+    state["recent_context_lines"].append(_context_line(role, content))
+
+
+def _context_line(role: str, content: str) -> str:
+    """Format a message as a canonical "role: content" prompt context line.
+
+    Whitespace runs are collapsed and long messages truncated, so equivalent
+    conversations produce identical (and shorter) prompts.
+    """
+    text = _WHITESPACE_RUN.sub(" ", content).strip()
+    if len(text) > RECENT_CONTEXT_MESSAGE_CHARS:
+        text = text[: RECENT_CONTEXT_MESSAGE_CHARS - 1].rstrip() + "…"
+    return f"{role}: {text}"
+
+
+def _build_recent_context_lines(messages: list[MessageDict]) -> deque[str]:
+    """Build the rolling prompt context from the last few messages."""
+    return deque(
+        (_context_line(msg["role"], msg["content"]) for msg in messages[-RECENT_CONTEXT_SIZE:]),
+        maxlen=RECENT_CONTEXT_SIZE,
+    )
+
+
+def recent_context(state: TutorState, count: int = RECENT_CONTEXT_SIZE) -> str:
+    """Format the last count messages (at most RECENT_CONTEXT_SIZE) as prompt context.
+
+    Args:
+        state: Agent state
+        count: Number of recent messages to include
+
+    Returns:
+        Newline-separated "role: content" lines
+    """
+    lines = state.get("recent_context_lines")
+    if lines is None:
+        lines = state["recent_context_lines"] = _build_recent_context_lines(state["messages"])
+    if count >= len(lines):
+        return "\n".join(lines)
+    return "\n".join(list(lines)[-count:])
 
 
 # ============================================================================
@@ -132,6 +338,194 @@ class TutorState(TypedDict):
 # ============================================================================
 
 
+# Shared connection pool for all HTTP-based LLM provider clients
+_http_client: Optional[httpx.AsyncClient] = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Get the shared pooled HTTP client used by LLM provider SDKs.
+
+    Connections are kept alive between node calls so each LLM request skips
+    DNS and the TLS handshake. Uses HTTP/2 (h2 comes with httpx[http2]).
+
+    Returns:
+        Shared httpx.AsyncClient instance
+    """
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(
+            http2=True,
+            limits=httpx.Limits(
+                max_connections=LLM_MAX_CONNECTIONS,
+                max_keepalive_connections=LLM_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=LLM_KEEPALIVE_EXPIRY,
+            ),
+            timeout=httpx.Timeout(600.0, connect=5.0),
+        )
+    return _http_client
+
+
+async def close_http_client() -> None:
+    """Close the shared HTTP client (called on application shutdown)."""
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised when LLM calls are short-circuited after repeated failures."""
+
+
+class CircuitBreaker:
+    """Stops calling the LLM provider for a cool-down period after consecutive failures.
+
+    After reset_seconds the circuit lets calls through again; one more failure
+    re-opens it immediately, a success closes it.
+    """
+
+    def __init__(self, failure_threshold: int, reset_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+
+    def check(self) -> None:
+        """Raise CircuitOpenError if the circuit is open."""
+        if self.opened_at is None:
+            return
+        remaining = self.reset_seconds - (time.monotonic() - self.opened_at)
+        if remaining > 0:
+            raise CircuitOpenError(f"LLM provider unavailable, retrying calls in {remaining:.0f}s")
+
+    def record_success(self) -> None:
+        """Close the circuit after a successful call."""
+        self.consecutive_failures = 0
+        self.opened_at = None
+
+    def record_failure(self) -> None:
+        """Count a failed call, opening the circuit at the threshold."""
+        self.consecutive_failures += 1
+        if self.consecutive_failures >= self.failure_threshold:
+            if self.opened_at is None:
+                logger.warning(
+                    f"⚠️ LLM circuit OPEN | failures={self.consecutive_failures} | "
+                    f"cooldown={self.reset_seconds:.0f}s"
+                )
+            self.opened_at = time.monotonic()
+
+
+# One breaker per provider, shared across that provider's clients so all sessions
+# back off together during an outage while other providers stay usable
+_circuit_breakers: dict[str, CircuitBreaker] = {}
+
+
+def get_circuit_breaker(provider: str) -> CircuitBreaker:
+    """Get the circuit breaker for an LLM provider, creating it on first use.
+
+    Args:
+        provider: LLM provider name
+
+    Returns:
+        The provider's shared CircuitBreaker
+    """
+    breaker = _circuit_breakers.get(provider)
+    if breaker is None:
+        breaker = CircuitBreaker(LLM_CIRCUIT_FAILURE_THRESHOLD, LLM_CIRCUIT_RESET_SECONDS)
+        _circuit_breakers[provider] = breaker
+    return breaker
+
+
+# Errors raised when the provider could not be reached or timed out
+_TRANSIENT_ERRORS = (
+    httpx.TransportError,
+    asyncio.TimeoutError,
+    openai.APIConnectionError,
+    anthropic.APIConnectionError,
+)
+
+
+def _is_transient_error(error: Exception) -> bool:
+    """Check whether a failed LLM call is worth retrying.
+
+    Rate limits (429), timeouts (408), server errors (5xx) and connection
+    failures are transient. Other errors, such as a 400 bad request or a 401
+    bad API key, fail the same way on every attempt.
+
+    Args:
+        error: Exception raised by the provider SDK
+
+    Returns:
+        True if the call may succeed when retried
+    """
+    status = getattr(error, "status_code", None)
+    if status is None:
+        # google.api_core exceptions carry the HTTP status as code
+        status = getattr(error, "code", None)
+    if isinstance(status, int):
+        return status in (408, 429) or status >= 500
+    return isinstance(error, _TRANSIENT_ERRORS)
+
+
+def _retry_delay(error: Exception, attempt: int) -> float:
+    """Get the delay before retrying a failed LLM call.
+
+    Honors the provider's Retry-After header on rate limit (429) responses;
+    otherwise uses exponential backoff with jitter. Both are capped at
+    LLM_RETRY_MAX_DELAY so a request handler never sleeps longer than that.
+
+    Args:
+        error: Exception raised by the provider SDK
+        attempt: Zero-based attempt number that failed
+
+    Returns:
+        Delay in seconds
+    """
+    response = getattr(error, "response", None)
+    if getattr(error, "status_code", None) == 429 and response is not None:
+        retry_after = response.headers.get("retry-after")
+        try:
+            return min(LLM_RETRY_MAX_DELAY, float(retry_after))
+        except (TypeError, ValueError):
+            pass
+
+    return min(LLM_RETRY_MAX_DELAY, (2**attempt) * random.uniform(0.5, 1.5))
+
+
+# Request slot semaphore, bound to the event loop it was created on
+_llm_slots: Optional[tuple[asyncio.AbstractEventLoop, asyncio.Semaphore]] = None
+_llm_call_stats = {"inflight": 0, "completed": 0}
+
+
+def get_llm_call_stats() -> dict:
+    """Get LLM request counters.
+
+    Returns:
+        Dict with inflight (requests holding a slot) and completed counts
+    """
+    return _llm_call_stats.copy()
+
+
+@contextlib.asynccontextmanager
+async def _llm_slot():
+    """Hold one of the LLM_INFLIGHT_LIMIT request slots shared by all clients."""
+    global _llm_slots
+    if LLM_INFLIGHT_LIMIT > 0:
+        loop = asyncio.get_running_loop()
+        if _llm_slots is None or _llm_slots[0] is not loop:
+            _llm_slots = (loop, asyncio.Semaphore(LLM_INFLIGHT_LIMIT))
+        await _llm_slots[1].acquire()
+
+    _llm_call_stats["inflight"] += 1
+    try:
+        yield
+    finally:
+        _llm_call_stats["inflight"] -= 1
+        _llm_call_stats["completed"] += 1
+        if LLM_INFLIGHT_LIMIT > 0:
+            _llm_slots[1].release()
+
+
 class LLMClient:
     """Unified client for multiple LLM providers with retry logic."""
 
@@ -139,6 +533,28 @@ class LLMClient:
         self.provider = provider
         self.model = model
         self._client = None
+        self._batch_queue: Optional[asyncio.Queue] = None
+        self._batch_task: Optional[asyncio.Task] = None
+        # The event loop only keeps weak references to tasks
+        self._dispatch_tasks: set[asyncio.Task] = set()
+        # Cleared if the model rejects response_format (e.g. gpt-4-turbo, grok-beta)
+        self._structured_output = True
+        # Provider-specific call paths, resolved once rather than on every request
+        try:
+            self._call_provider = {
+                "openai": self._call_openai,
+                "xai": self._call_openai,
+                "anthropic": self._call_anthropic,
+                "google": self._call_google,
+            }[provider]
+            self._stream_provider = {
+                "openai": self._stream_openai,
+                "xai": self._stream_openai,
+                "anthropic": self._stream_anthropic,
+                "google": self._stream_google,
+            }[provider]
+        except KeyError:
+            raise ValueError(f"Unknown LLM provider: {provider}") from None
 
     def _get_client(self):
         """Lazily initialize the appropriate LLM client."""
@@ -146,11 +562,13 @@ class LLMClient:
             return self._client
 
         if self.provider == "openai":
-            self._client = AsyncOpenAI(api_key=OPENAI_API_KEY)
+            self._client = AsyncOpenAI(api_key=OPENAI_API_KEY, http_client=get_http_client())
         elif self.provider == "anthropic":
-            self._client = AsyncAnthropic(api_key=ANTHROPIC_API_KEY)
+            self._client = AsyncAnthropic(api_key=ANTHROPIC_API_KEY, http_client=get_http_client())
         elif self.provider == "xai":
-            self._client = AsyncOpenAI(api_key=XAI_API_KEY, base_url="https://api.x.ai/v1")
+            self._client = AsyncOpenAI(
+                api_key=XAI_API_KEY, base_url="https://api.x.ai/v1", http_client=get_http_client()
+            )
         elif self.provider == "google":
             # Google Gemini uses a different API pattern
             try:
@@ -167,59 +585,728 @@ class LLMClient:
 
         return self._client
 
-    async def generate(self, prompt: str, max_retries: int = 3) -> str:
+    async def warm_up(self) -> None:
+        """Open a pooled connection to the provider ahead of the first LLM call.
+
+        Sends a HEAD request to the SDK's API base URL over the shared HTTP client
+        so DNS and the TLS handshake are done at startup; the response status is
+        irrelevant. Google's SDK uses its own transport, so it is skipped.
+        """
+        try:
+            base_url = getattr(self._get_client(), "base_url", None)
+            if base_url is None:
+                return
+            await get_http_client().head(str(base_url))
+            logger.info(f"✓ LLM connection warmed up | provider={self.provider}")
+        except Exception as e:
+            logger.warning(f"LLM connection warm-up failed: {e}")
+
+    async def generate(
+        self,
+        prompt: str,
+        max_retries: int = 3,
+        system: Optional[str] = None,
+        json_schema: Optional[dict] = None,
+        max_tokens: int = 1000,
+        temperature: float = 0.7,
+    ) -> str:
         """Generate a response from the LLM with retry logic.
 
+        Static instructions go in system so every request for a node shares the
+        same prefix, letting providers reuse their server-side prompt caches.
+
         Args:
-            prompt: The prompt to send to the LLM
+            prompt: The user prompt (dynamic, state-specific content)
             max_retries: Maximum number of retry attempts
+            system: Static system instructions, sent ahead of the prompt
+            json_schema: JSON schema the response must follow. Uses the provider's
+                structured output mode where the model supports it; otherwise the
+                system prompt's format instructions apply, so parse the response
+                with _parse_json_response.
+            max_tokens: Maximum tokens to generate (size to the expected output)
+            temperature: Sampling temperature
 
         Returns:
             Generated text response
 
         Raises:
-            Exception: If all retries fail
+            Exception: If all retries fail (on the fallback provider too, if set)
         """
+        try:
+            if LLM_BATCH_WINDOW_MS > 0:
+                return await self._enqueue_batched(
+                    prompt,
+                    system=system,
+                    max_tokens=max_tokens,
+                    temperature=temperature,
+                    json_schema=json_schema,
+                )
+            return await self._generate_direct(
+                prompt,
+                max_retries=max_retries,
+                system=system,
+                max_tokens=max_tokens,
+                json_schema=json_schema,
+                temperature=temperature,
+            )
+        except RuntimeError as e:
+            # Circuit open or retries exhausted; other errors are not provider outages
+            fallback = _fallback_llm_client(self.provider)
+            if fallback is None:
+                raise
+            logger.warning(
+                f"⚠️ LLM failover | {self.provider}/{self.model} → "
+                f"{fallback.provider}/{fallback.model} | {e}"
+            )
+            return await fallback.generate(
+                prompt,
+                max_retries=max_retries,
+                system=system,
+                json_schema=json_schema,
+                max_tokens=max_tokens,
+                temperature=temperature,
+            )
+
+    async def _generate_direct(
+        self,
+        prompt: str,
+        *,
+        max_retries: int = 3,
+        system: Optional[str] = None,
+        max_tokens: int = 1000,
+        json_schema: Optional[dict] = None,
+        temperature: float = 0.7,
+    ) -> str:
+        """Send a single prompt to the provider with retry logic (see generate)."""
         client = self._get_client()
+        circuit_breaker = get_circuit_breaker(self.provider)
 
         for attempt in range(max_retries):
+            circuit_breaker.check()
             try:
-                if self.provider in ["openai", "xai"]:
-                    response = await client.chat.completions.create(
-                        model=self.model,
-                        messages=[{"role": "user", "content": prompt}],
-                        temperature=0.7,
-                        max_tokens=1000,
-                    )
-                    return response.choices[0].message.content
-
-                elif self.provider == "anthropic":
-                    response = await client.messages.create(
-                        model=self.model,
-                        max_tokens=1000,
-                        messages=[{"role": "user", "content": prompt}],
+                # Slot held per attempt, not across the backoff sleep
+                async with _llm_slot():
+                    start = time.perf_counter()
+                    text = await self._call_provider(
+                        client, prompt, system, max_tokens, json_schema, temperature
                     )
-                    return response.content[0].text
-
-                elif self.provider == "google":
-                    model = client.GenerativeModel(self.model)
-                    response = await model.generate_content_async(prompt)
-                    return response.text
+                logger.debug(
+                    f"LLM call | model={self.model} | latency={time.perf_counter() - start:.2f}s"
+                )
+                circuit_breaker.record_success()
+                return text
 
             except Exception as e:
+                if json_schema and self._disable_rejected_structured_output(e):
+                    continue
+                if not _is_transient_error(e):
+                    # Bad request, bad API key...: retrying won't help, and it says
+                    # nothing about provider health, so leave the circuit alone
+                    raise
+                circuit_breaker.record_failure()
                 if attempt == max_retries - 1:
                     # Last attempt failed
                     raise RuntimeError(
                         f"LLM API failed after {max_retries} attempts: {str(e)}"
                     ) from e
-                # Exponential backoff
-                await asyncio.sleep(2**attempt)
+                # Jittered exponential backoff (or the provider's Retry-After)
+                await asyncio.sleep(_retry_delay(e, attempt))
 
         raise RuntimeError("LLM generation failed")
 
+    def _disable_rejected_structured_output(self, error: Exception) -> bool:
+        """Fall back to prompt-only JSON if the model rejected the response_format schema.
+
+        Args:
+            error: Exception raised by the provider SDK
+
+        Returns:
+            True if structured output was just disabled and the call should be retried
+        """
+        if (
+            self.provider in ["openai", "xai"]
+            and self._structured_output
+            and getattr(error, "status_code", None) == 400
+            and "response_format" in str(error)
+        ):
+            logger.warning(
+                f"⚠️ Structured output not supported | model={self.model} | "
+                f"falling back to prompt-only JSON"
+            )
+            self._structured_output = False
+            return True
+        return False
+
+    async def _call_openai(
+        self,
+        client,
+        prompt: str,
+        system: Optional[str],
+        max_tokens: int,
+        json_schema: Optional[dict],
+        temperature: float,
+    ) -> str:
+        """Make one OpenAI-compatible (OpenAI, xAI) API call and return the response text."""
+        messages = [{"role": "user", "content": prompt}]
+        if system:
+            messages.insert(0, {"role": "system", "content": system})
+        kwargs = {}
+        if json_schema and self._structured_output:
+            kwargs["response_format"] = {
+                "type": "json_schema",
+                "json_schema": {
+                    "name": "response",
+                    "schema": json_schema,
+                    "strict": True,
+                },
+            }
+        response = await client.chat.completions.create(
+            model=self.model,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            **kwargs,
+        )
+        return response.choices[0].message.content
+
+    async def _call_anthropic(
+        self,
+        client,
+        prompt: str,
+        system: Optional[str],
+        max_tokens: int,
+        json_schema: Optional[dict],
+        temperature: float,
+    ) -> str:
+        """Make one Anthropic API call and return the response text."""
+        kwargs = {}
+        if system:
+            # Mark the static block as a cacheable prompt prefix
+            kwargs["system"] = [
+                {"type": "text", "text": system, "cache_control": {"type": "ephemeral"}}
+            ]
+        if json_schema:
+            kwargs["tools"] = [
+                {
+                    "name": "respond",
+                    "description": "Return the response in the required format",
+                    "input_schema": json_schema,
+                }
+            ]
+            kwargs["tool_choice"] = {"type": "tool", "name": "respond"}
+        response = await client.messages.create(
+            model=self.model,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            messages=[{"role": "user", "content": prompt}],
+            **kwargs,
+        )
+        if json_schema:
+            # Forced tool call: the tool input is the structured response
+            tool_use = next(b for b in response.content if b.type == "tool_use")
+            return orjson.dumps(tool_use.input).decode()
+        return response.content[0].text
+
+    async def _call_google(
+        self,
+        client,
+        prompt: str,
+        system: Optional[str],
+        max_tokens: int,
+        json_schema: Optional[dict],
+        temperature: float,
+    ) -> str:
+        """Make one Google Gemini API call and return the response text."""
+        model = client.GenerativeModel(self.model, system_instruction=system)
+        generation_config = {"max_output_tokens": max_tokens, "temperature": temperature}
+        if json_schema:
+            generation_config["response_mime_type"] = "application/json"
+        response = await model.generate_content_async(prompt, generation_config=generation_config)
+        return response.text
+
+    async def generate_stream(
+        self,
+        prompt: str,
+        system: Optional[str] = None,
+        max_tokens: int = 1000,
+        temperature: float = 0.7,
+    ) -> AsyncIterator[str]:
+        """Stream a response from the LLM as text chunks.
+
+        No retries are attempted; errors propagate to the caller. Transient
+        failures count towards the circuit breaker like generate's do.
+
+        Args:
+            prompt: The user prompt (dynamic, state-specific content)
+            system: Static system instructions, sent ahead of the prompt
+            max_tokens: Maximum number of tokens to generate
+            temperature: Sampling temperature
+
+        Yields:
+            Text chunks in generation order
+        """
+        circuit_breaker = get_circuit_breaker(self.provider)
+        circuit_breaker.check()
+        client = self._get_client()
+
+        try:
+            async with _llm_slot():
+                start = time.perf_counter()
+                first_chunk = True
+                async for text in self._stream_provider(
+                    client, prompt, system, max_tokens, temperature
+                ):
+                    if first_chunk:
+                        first_chunk = False
+                        logger.debug(
+                            f"LLM stream | model={self.model} | "
+                            f"ttft={time.perf_counter() - start:.2f}s"
+                        )
+                    yield text
+        except Exception as e:
+            if _is_transient_error(e):
+                circuit_breaker.record_failure()
+            raise
+        circuit_breaker.record_success()
+
+    async def _stream_openai(
+        self,
+        client,
+        prompt: str,
+        system: Optional[str],
+        max_tokens: int,
+        temperature: float,
+    ) -> AsyncIterator[str]:
+        """Make one streaming OpenAI-compatible API call, yielding text chunks."""
+        messages = [{"role": "user", "content": prompt}]
+        if system:
+            messages.insert(0, {"role": "system", "content": system})
+        stream = await client.chat.completions.create(
+            model=self.model,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            stream=True,
+        )
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+    async def _stream_anthropic(
+        self,
+        client,
+        prompt: str,
+        system: Optional[str],
+        max_tokens: int,
+        temperature: float,
+    ) -> AsyncIterator[str]:
+        """Make one streaming Anthropic API call, yielding text chunks."""
+        kwargs = {}
+        if system:
+            kwargs["system"] = [
+                {"type": "text", "text": system, "cache_control": {"type": "ephemeral"}}
+            ]
+        async with client.messages.stream(
+            model=self.model,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            messages=[{"role": "user", "content": prompt}],
+            **kwargs,
+        ) as stream:
+            async for text in stream.text_stream:
+                yield text
+
+    async def _stream_google(
+        self,
+        client,
+        prompt: str,
+        system: Optional[str],
+        max_tokens: int,
+        temperature: float,
+    ) -> AsyncIterator[str]:
+        """Make one streaming Google Gemini API call, yielding text chunks."""
+        model = client.GenerativeModel(self.model, system_instruction=system)
+        response = await model.generate_content_async(
+            prompt,
+            generation_config={"max_output_tokens": max_tokens, "temperature": temperature},
+            stream=True,
+        )
+        async for chunk in response:
+            if chunk.text:
+                yield chunk.text
+
+    async def _enqueue_batched(
+        self,
+        prompt: str,
+        *,
+        system: Optional[str],
+        max_tokens: int,
+        temperature: float,
+        json_schema: Optional[dict],
+    ) -> str:
+        """Queue a prompt for the batch dispatcher and wait for its response."""
+        if self._batch_task is None or self._batch_task.done():
+            self._batch_queue = asyncio.Queue()
+            self._batch_task = asyncio.create_task(self._batch_dispatcher())
+
+        future = asyncio.get_running_loop().create_future()
+        await self._batch_queue.put((prompt, system, max_tokens, temperature, json_schema, future))
+        return await future
+
+    async def _batch_dispatcher(self) -> None:
+        """Collect queued prompts for up to LLM_BATCH_WINDOW_MS and dispatch them together."""
+        loop = asyncio.get_running_loop()
+        batch: list = []
+
+        try:
+            while True:
+                batch = [await self._batch_queue.get()]
+                deadline = loop.time() + LLM_BATCH_WINDOW_MS / 1000
+
+                while len(batch) < LLM_BATCH_SIZE:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(self._batch_queue.get(), timeout))
+                    except asyncio.TimeoutError:
+                        break
+
+                # Only prompts sharing system prompt, temperature and schema (same node) combine
+                groups: dict[tuple[Optional[str], float, Optional[bytes]], list] = {}
+                for item in batch:
+                    schema_key = (
+                        orjson.dumps(item[4], option=orjson.OPT_SORT_KEYS) if item[4] else None
+                    )
+                    groups.setdefault((item[1], item[3], schema_key), []).append(item)
+
+                for (system, temperature, _), items in groups.items():
+                    task = asyncio.create_task(
+                        self._dispatch_batch(system, temperature, items[0][4], items)
+                    )
+                    self._dispatch_tasks.add(task)
+                    task.add_done_callback(self._dispatch_tasks.discard)
+                batch = []
+        finally:
+            # Don't leave callers waiting on prompts that will never be dispatched
+            while not self._batch_queue.empty():
+                batch.append(self._batch_queue.get_nowait())
+            error = RuntimeError("LLM batch dispatcher stopped")
+            for *_, future in batch:
+                if not future.done():
+                    future.set_exception(error)
+
+    async def _dispatch_batch(
+        self,
+        system: Optional[str],
+        temperature: float,
+        json_schema: Optional[dict],
+        items: list,
+    ) -> None:
+        """Resolve a group of queued prompts with one combined LLM request.
+
+        Structured (json_schema) prompts are combined under a schema wrapping an
+        array of per-prompt responses. Falls back to one request per prompt for
+        single items or when the combined response cannot be split back into
+        per-prompt answers.
+        """
+        responses: Optional[list] = None
+
+        if len(items) > 1:
+            sections = "\n\n".join(
+                f"### Prompt {i + 1}\n{prompt}" for i, (prompt, *_) in enumerate(items)
+            )
+            if json_schema is None:
+                batch_schema = None
+                output_format = (
+                    f"Return ONLY a JSON array of {len(items)} strings, where element i is "
+                    f"your complete response to prompt i."
+                )
+            else:
+                batch_schema = {
+                    "type": "object",
+                    "properties": {"responses": {"type": "array", "items": json_schema}},
+                    "required": ["responses"],
+                    "additionalProperties": False,
+                }
+                output_format = (
+                    f'Return ONLY a JSON object whose "responses" array has {len(items)} '
+                    f"elements, where element i is your JSON response to prompt i."
+                )
+            combined = (
+                f"Respond to each of the following {len(items)} independent prompts.\n"
+                f"{output_format}\n\n{sections}"
+            )
+            try:
+                response = await self._generate_direct(
+                    combined,
+                    system=system,
+                    max_tokens=sum(item[2] for item in items),
+                    json_schema=batch_schema,
+                    temperature=temperature,
+                )
+                if json_schema is None:
+                    parsed = orjson.loads(_strip_code_fence(response))
+                else:
+                    parsed = _parse_json_response(response).get("responses")
+                if isinstance(parsed, list) and len(parsed) == len(items):
+                    responses = [
+                        str(part) if json_schema is None else orjson.dumps(part).decode()
+                        for part in parsed
+                    ]
+                    logger.info(f"LLM batch dispatched | prompts={len(items)}")
+                else:
+                    logger.warning("LLM batch response malformed, falling back to single calls")
+            except Exception as e:
+                logger.warning(f"LLM batch request failed, falling back to single calls: {e}")
+
+        if responses is None:
+            results = await asyncio.gather(
+                *(
+                    self._generate_direct(
+                        prompt,
+                        system=system,
+                        max_tokens=max_tokens,
+                        json_schema=json_schema,
+                        temperature=temperature,
+                    )
+                    for prompt, _, max_tokens, *_ in items
+                ),
+                return_exceptions=True,
+            )
+        else:
+            results = responses
 
-# Global LLM client instance
-llm_client = LLMClient()
+        for (*_, future), result in zip(items, results):
+            if future.done():
+                continue
+            if isinstance(result, BaseException):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+
+@functools.lru_cache(maxsize=8)
+def get_llm_client(provider: str, model: str) -> LLMClient:
+    """Get the shared LLMClient for a provider and model, creating it on first use.
+
+    All clients send their requests over the one pooled HTTP client
+    (get_http_client), so extra providers or models don't add connection pools.
+
+    Args:
+        provider: LLM provider (openai, anthropic, google, or xai)
+        model: Provider-specific model name
+
+    Returns:
+        LLMClient singleton for (provider, model)
+    """
+    return LLMClient(provider=provider, model=model)
+
+
+def _fallback_llm_client(provider: str) -> Optional[LLMClient]:
+    """Get the failover client for calls that failed on a provider.
+
+    Args:
+        provider: Provider the call failed on
+
+    Returns:
+        Client for LLM_FALLBACK_PROVIDER/LLM_FALLBACK_MODEL, or None if failover is
+        not configured or the call already failed on the fallback provider
+    """
+    if not (LLM_FALLBACK_PROVIDER and LLM_FALLBACK_MODEL) or provider == LLM_FALLBACK_PROVIDER:
+        return None
+    return get_llm_client(LLM_FALLBACK_PROVIDER, LLM_FALLBACK_MODEL)
+
+
+# Global LLM client instance, with the provider client built up front so the
+# first request doesn't pay for SDK setup (the connection is opened by warm_up)
+llm_client = get_llm_client(LLM_PROVIDER, LLM_MODEL)
+try:
+    llm_client._get_client()
+except Exception as e:
+    # Missing API key or SDK - defer the error to the first LLM call
+    logger.warning(f"LLM client not initialized at startup: {e}")
+
+# Client for classification calls; same provider and connection pool, own model
+# (the same instance as llm_client when LLM_FAST_MODEL is unset)
+fast_llm_client = get_llm_client(LLM_PROVIDER, LLM_FAST_MODEL)
+
+# Callback receiving streamed text chunks for the current request (None = don't stream).
+# Set by the chat route before running a node; nodes that produce free text stream
+# through it while still returning the full message in state.
+token_emitter: ContextVar[Optional[Callable[[str], None]]] = ContextVar(
+    "token_emitter", default=None
+)
+
+
+async def _generate_text(prompt: str, system: Optional[str] = None, max_tokens: int = 1000) -> str:
+    """Generate a free-text response, streaming chunks to token_emitter if set.
+
+    Args:
+        prompt: The user prompt
+        system: Static system instructions
+        max_tokens: Maximum tokens to generate
+
+    Returns:
+        Full generated text
+    """
+    emit = token_emitter.get()
+    if emit is None:
+        return await llm_client.generate(prompt, system=system, max_tokens=max_tokens)
+
+    chunks: list[str] = []
+    try:
+        async for chunk in llm_client.generate_stream(prompt, system=system, max_tokens=max_tokens):
+            chunks.append(chunk)
+            emit(chunk)
+    except Exception as e:
+        if chunks:
+            raise
+        # Nothing streamed yet - fall back to the non-streaming call with retries
+        logger.warning(f"LLM stream failed before first token, retrying without streaming: {e}")
+        return await llm_client.generate(prompt, system=system, max_tokens=max_tokens)
+
+    return "".join(chunks)
+
+
+# ============================================================================
+# Prompt Templates
+# ============================================================================
+# Static instructions for each node, sent as the system prompt. Session-specific
+# content (topic, conversation, answers) goes in the user prompt, after them.
+
+EXPOSITION_SYSTEM = """You are a patient, encouraging GCSE mathematics tutor.
+
+Your task: Provide a clear, engaging explanation of the topic the student is learning.
+- Use friendly, age-appropriate language (14-16 years old)
+- Include a concrete example
+- Keep it concise (2-3 paragraphs)
+- End by asking if they have any questions before moving to practice
+
+Do NOT ask a practice question yet - just explain the concept clearly."""
+
+FOLLOWUP_SYSTEM = """You are a patient, encouraging GCSE mathematics tutor.
+
+The student has asked a follow-up question about the concept you're explaining.
+
+Your task: Answer their question clearly and helpfully.
+- Be patient and encouraging
+- Provide additional explanation or examples if needed
+- Keep it focused on the topic being taught
+- After answering, ask if they'd like to try a practice question or have more questions
+
+Do NOT ask a practice question yet unless they explicitly request one."""
+
+QUESTIONING_SYSTEM = """You are a GCSE mathematics tutor.
+
+Your task: Ask ONE clear, appropriate practice question.
+- Make it suitable for GCSE level
+- The question should test understanding of the topic being taught
+- Be specific and clear about what you're asking
+- If the question requires numerical calculation, it should be solvable with basic arithmetic
+
+Also classify the question:
+- numerical = true if it requires actual number computation (e.g. "Calculate 3/4 + 2/5")
+- numerical = false for algebraic manipulation, proofs or concepts (e.g. "Simplify 2x + 3x")
+
+Respond with JSON in this exact format (no additional explanation):
+{
+    "question": "The question text",
+    "numerical": true/false
+}"""
+
+QUESTION_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "question": {"type": "string"},
+        "numerical": {"type": "boolean"},
+    },
+    "required": ["question", "numerical"],
+    "additionalProperties": False,
+}
+
+EVALUATION_SYSTEM = """You are evaluating a GCSE mathematics student's answer.
+
+Evaluate the answer and respond with JSON in this exact format:
+{
+    "correct": true/false,
+    "feedback": "Brief feedback explaining why it's correct or incorrect",
+    "socratic_hint": "Guiding question if incorrect (see below), or null if correct"
+}
+
+Be encouraging even when incorrect. Keep feedback brief (1-2 sentences).
+
+If the answer is incorrect, socratic_hint is ONE simple, focused question that guides
+the student to discover their mistake (the Socratic method). NEVER give the answer or
+the steps; focus on the one key concept they're missing. Be warm and encouraging."""
+
+EVALUATION_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "correct": {"type": "boolean"},
+        "feedback": {"type": "string"},
+        "socratic_hint": {"type": ["string", "null"]},
+    },
+    "required": ["correct", "feedback", "socratic_hint"],
+    "additionalProperties": False,
+}
+
+SOCRATIC_SYSTEM = """You are a GCSE mathematics tutor using the Socratic method to guide a student.
+
+THE SOCRATIC METHOD - Critical Guidelines:
+1. NEVER tell them what to do
+2. NEVER give the answer or steps
+3. ALWAYS ask a question that makes them think
+4. Focus on ONE key concept they're missing
+5. Guide them to discover the error themselves
+
+Examples of good Socratic questions:
+- "When you expand a bracket, how many terms do you need to multiply?"
+- "What does the minus sign in front of a bracket do to the terms inside?"
+- "If you have 5(2y - 3), what are you multiplying 5 by?"
+
+Your task: Ask ONE simple, focused question that guides them toward understanding.
+Be warm and encouraging. Don't explain - just ask."""
+
+CALCULATOR_SYSTEM = """Classify this math question as NUMERICAL or NON_NUMERICAL.
+
+NUMERICAL: Requires actual number computation (e.g., "Calculate 3/4 + 2/5", "What is 15% of 240?")
+NON_NUMERICAL: Algebraic manipulation, proofs, concepts (e.g., "Simplify 2x + 3x", "Explain Pythagoras' theorem")
+
+Answer with only one word: NUMERICAL or NON_NUMERICAL"""
+
+# User prompt templates, compiled once at import and filled per call
+EXPOSITION_PROMPT = Template("Topic: $subtopic_name")
+
+CONVERSATION_PROMPT = Template("""Topic: $subtopic_name
+
+Recent conversation:
+$context""")
+
+EVALUATION_PROMPT = Template("""Question: $question
+Student's answer: $answer""")
+
+SOCRATIC_PROMPT = Template("""Original question: $question
+Student's incorrect answer: $answer
+Topic: $subtopic_name
+
+Recent conversation:
+$context""")
+
+CALCULATOR_PROMPT = Template("Question: $question")
+
+WHITEBOARD_PROMPT = Template("""
+now take the text from your reply and transform it into a professor's whiteboard image:
+diagrams, arrows, boxes, and captions explaining the core idea visually. Use colors as well.
+
+Text to visualize:
+$exposition_text""")
+
+# Stored with each cached exposition; editing the exposition prompts changes
+# the hash, so entries generated from an older prompt are regenerated
+EXPOSITION_PROMPT_VERSION = hashlib.sha256(
+    (EXPOSITION_SYSTEM + EXPOSITION_PROMPT.template).encode()
+).hexdigest()[:12]
 
 
 # ============================================================================
@@ -227,6 +1314,185 @@ llm_client = LLMClient()
 # ============================================================================
 
 
+class _TokenFanout:
+    """token_emitter for a shared generation: streams its chunks to every subscriber.
+
+    Subscribers joining mid-generation are first sent the chunks generated so far.
+    """
+
+    def __init__(self):
+        self.chunks: list[str] = []
+        self.listeners: list[Callable[[str], None]] = []
+
+    def __call__(self, chunk: str) -> None:
+        self.chunks.append(chunk)
+        for listener in list(self.listeners):
+            listener(chunk)
+
+    def subscribe(self, listener: Callable[[str], None]) -> None:
+        for chunk in self.chunks:
+            listener(chunk)
+        self.listeners.append(listener)
+
+    def unsubscribe(self, listener: Callable[[str], None]) -> None:
+        if listener in self.listeners:
+            self.listeners.remove(listener)
+
+
+# Exposition generations in flight, keyed like the exposition memory cache, so
+# concurrent cache misses for the same subtopic (e.g. a class starting the same
+# lesson) share one LLM call and its token stream
+_exposition_tasks: dict[tuple[str, int], tuple[asyncio.Task, _TokenFanout]] = {}
+
+
+async def _generate_and_cache_exposition(subtopic_id: int, subtopic_name: str) -> str:
+    """Generate the initial exposition for a subtopic and save it to both caches.
+
+    Args:
+        subtopic_id: Subtopic ID the exposition is cached under
+        subtopic_name: Subtopic name to explain
+
+    Returns:
+        Generated exposition text
+    """
+    prompt = EXPOSITION_PROMPT.substitute(subtopic_name=subtopic_name)
+    explanation = await _generate_text(prompt, system=EXPOSITION_SYSTEM)
+
+    # Memory cache first, so lookups made while SQLite is written already hit
+    _mem_cache_put(
+        _exposition_mem_cache,
+        (DATABASE_PATH, subtopic_id),
+        {
+            "exposition_content": explanation,
+            "generated_at": iso_now(),
+            "model_identifier": LLM_MODEL,
+            "prompt_version": EXPOSITION_PROMPT_VERSION,
+        },
+    )
+
+    # Save to cache after successful generation (off the event loop); a failed
+    # write costs a regeneration later, not the exposition the student is waiting for
+    try:
+        await asyncio.to_thread(
+            save_cached_exposition,
+            subtopic_id=subtopic_id,
+            content=explanation,
+            model_identifier=LLM_MODEL,
+            db_path=DATABASE_PATH,
+            prompt_version=EXPOSITION_PROMPT_VERSION,
+        )
+    except Exception as e:
+        logger.error(f"Failed to save exposition to cache | subtopic_id={subtopic_id} | {e}")
+        return explanation
+
+    logger.info(f"✓ Cached new exposition for subtopic {subtopic_id}")
+    return explanation
+
+
+def _exposition_task(subtopic_id: int, subtopic_name: str) -> tuple[asyncio.Task, _TokenFanout]:
+    """Get the in-flight exposition generation for a subtopic, starting one if needed.
+
+    The task runs with its own token_emitter rather than the starting request's;
+    subscribe to the returned fanout to receive its streamed chunks.
+
+    Args:
+        subtopic_id: Subtopic ID the exposition is cached under
+        subtopic_name: Subtopic name to explain
+
+    Returns:
+        Tuple of the task resolving to the exposition text (await it through
+        asyncio.shield) and the fanout streaming its chunks
+    """
+    key = (DATABASE_PATH, subtopic_id)
+    in_flight = _exposition_tasks.get(key)
+    if in_flight is None:
+        fanout = _TokenFanout()
+        context = copy_context()
+        context.run(token_emitter.set, fanout)
+        task = asyncio.create_task(
+            _generate_and_cache_exposition(subtopic_id, subtopic_name), context=context
+        )
+        in_flight = _exposition_tasks[key] = (task, fanout)
+        task.add_done_callback(lambda _task: _exposition_tasks.pop(key, None))
+    else:
+        logger.info(f"Exposition already generating for subtopic {subtopic_id}")
+    return in_flight
+
+
+async def prewarm_expositions(subtopics: list[tuple[int, str]]) -> int:
+    """Generate and cache expositions for several subtopics concurrently.
+
+    Subtopics that are already cached are skipped. At most
+    EXPOSITION_PREWARM_CONCURRENCY generations run at once, and generations
+    already in flight (e.g. a student's cache miss) are joined, not repeated.
+
+    Args:
+        subtopics: List of (subtopic_id, subtopic_name) tuples
+
+    Returns:
+        Number of expositions generated
+    """
+    semaphore = asyncio.Semaphore(EXPOSITION_PREWARM_CONCURRENCY)
+
+    async def prewarm(subtopic_id: int, subtopic_name: str) -> bool:
+        async with semaphore:
+            if await _get_exposition(subtopic_id):
+                return False
+            task, _fanout = _exposition_task(subtopic_id, subtopic_name)
+            await asyncio.shield(task)
+            return True
+
+    results = await asyncio.gather(
+        *(prewarm(subtopic_id, name) for subtopic_id, name in subtopics), return_exceptions=True
+    )
+    generated = sum(result is True for result in results)
+    failed = sum(isinstance(result, BaseException) for result in results)
+    logger.info(
+        f"Exposition PREWARM | "
+        f"requested={len(subtopics)} | "
+        f"generated={generated} | "
+        f"failed={failed}"
+    )
+    return generated
+
+
+# Background prewarm tasks (the event loop only keeps weak references)
+_prewarm_tasks: set[asyncio.Task] = set()
+
+
+def schedule_exposition_prewarm(subtopic_id: int) -> None:
+    """Start background generation of the expositions following a subtopic.
+
+    Generates up to EXPOSITION_PREWARM_COUNT expositions for the subtopics after
+    subtopic_id in syllabus order, so the student's next lessons start from cache.
+
+    Args:
+        subtopic_id: Subtopic the student is starting
+    """
+    if EXPOSITION_PREWARM_COUNT <= 0:
+        return
+
+    task = asyncio.create_task(_prewarm_upcoming_expositions(subtopic_id))
+    _prewarm_tasks.add(task)
+    task.add_done_callback(_prewarm_tasks.discard)
+
+
+async def _prewarm_upcoming_expositions(subtopic_id: int) -> None:
+    """Prewarm expositions for upcoming subtopics (background task body).
+
+    Args:
+        subtopic_id: Subtopic the student is starting
+    """
+    try:
+        upcoming = await asyncio.to_thread(
+            get_upcoming_subtopics, subtopic_id, EXPOSITION_PREWARM_COUNT, DATABASE_PATH
+        )
+        if upcoming:
+            await prewarm_expositions(upcoming)
+    except Exception as e:
+        logger.warning(f"Exposition prewarm failed | subtopic_id={subtopic_id} | error={e}")
+
+
 async def exposition_node(state: TutorState) -> TutorState:
     """Generate or retrieve cached concept explanation for the current subtopic.
 
@@ -247,7 +1513,7 @@ async def exposition_node(state: TutorState) -> TutorState:
 
     if is_initial:
         # Initial exposition - check cache first
-        cached = get_cached_exposition(subtopic_id, DATABASE_PATH)
+        cached = await _get_exposition(subtopic_id)
 
         if cached:
             # Cache hit - use cached content
@@ -256,53 +1522,41 @@ async def exposition_node(state: TutorState) -> TutorState:
                 f"✓ Cache HIT for subtopic {subtopic_id} (model: {cached['model_identifier']})"
             )
         else:
-            # Cache miss - generate via LLM
+            # Cache miss - generate via LLM (or join a generation already running)
             logger.info(f"✗ Cache MISS for subtopic {subtopic_id}, generating new exposition")
 
-            prompt = f"""
-You are a patient, encouraging GCSE mathematics tutor,
-helping a student learn {state['subtopic_name']}.
-
-Your task: Provide a clear, engaging explanation of this topic.
-- Use friendly, age-appropriate language (14-16 years old)
-- Include a concrete example
-- Keep it concise (2-3 paragraphs)
-- End by asking if they have any questions before moving to practice
-
-Do NOT ask a practice question yet - just explain the concept clearly."""
-
-            try:
-                explanation = await llm_client.generate(prompt)
-
-                # NEW: Save to cache after successful generation
-                save_cached_exposition(
-                    subtopic_id=subtopic_id,
-                    content=explanation,
-                    model_identifier=LLM_MODEL,
-                    db_path=DATABASE_PATH,
-                )
-                logger.info(f"✓ Cached new exposition for subtopic {subtopic_id}")
+            emit = token_emitter.get()
+            fanout = None
+            try:
+                task, fanout = _exposition_task(subtopic_id, state["subtopic_name"])
+                if emit is not None:
+                    fanout.subscribe(emit)
+
+                # Shielded: a student leaving mid-generation doesn't cancel it for the others
+                explanation = await asyncio.shield(task)
 
             except Exception as e:
                 # Error handling
                 logger.error("Exposition generation failed: %s", str(e))
-                state["messages"].append(
-                    {
-                        "role": "tutor",
-                        "content": "I'm having trouble connecting right now."
-                        f"Please try again in a moment. "
-                        f"(Error: {str(e)})",
-                        "timestamp": datetime.utcnow().isoformat(),
-                    }
+                append_message(
+                    state,
+                    "tutor",
+                    "I'm having trouble connecting right now."
+                    f"Please try again in a moment. "
+                    f"(Error: {str(e)})",
                 )
                 return state
 
+            finally:
+                if fanout is not None:
+                    fanout.unsubscribe(emit)
+
         # Image Generation Integration (spec 003 - US2/US3)
         # Retrieve cached image or generate new one
         # This happens asynchronously so text displays first
         try:
             # Check if image already exists in cache (US2: Cache Retrieval)
-            cached_image = get_cached_image(subtopic_id, DATABASE_PATH)
+            cached_image = await _get_image_metadata(subtopic_id)
 
             if cached_image:
                 # Cache hit - image available instantly (<1s)
@@ -325,46 +1579,9 @@ Do NOT ask a practice question yet - just explain the concept clearly."""
                 )
                 _update_cache_stats(is_hit=False)
 
-                # Generate image asynchronously (non-blocking for text display)
-                image_data = await generate_whiteboard_image(
-                    exposition_text=explanation,
-                    model=IMAGE_GENERATION_MODEL,
-                    resolution=IMAGE_GENERATION_RESOLUTION,
-                )
-
-                if image_data:
-                    # Validate image before caching
-                    if validate_image_data(image_data):
-                        # Save validated image to cache
-                        save_cached_image(
-                            subtopic_id=subtopic_id,
-                            image_data=image_data,
-                            model_identifier=IMAGE_GENERATION_MODEL,
-                            prompt_version="v1",
-                            db_path=DATABASE_PATH,
-                        )
-                        logger.info(
-                            f"✓ Image CACHED | "
-                            f"subtopic_id={subtopic_id} | "
-                            f"size={len(image_data)} bytes | "
-                            f"model={IMAGE_GENERATION_MODEL} | "
-                            f"format=PNG | "
-                            f"prompt_version=v1"
-                        )
-                    else:
-                        logger.warning(
-                            f"⚠️ Image VALIDATION_FAILED | "
-                            f"subtopic_id={subtopic_id} | "
-                            f"size={len(image_data)} bytes | "
-                            f"action=not_caching"
-                        )
-                else:
-                    logger.warning(
-                        f"⚠️ Image GENERATION_FAILED | "
-                        f"subtopic_id={subtopic_id} | "
-                        f"result=None | "
-                        f"action=continuing_text_only"
-                    )
+                # Generate image in the background so the exposition text is returned
+                # immediately; the frontend polls /api/image/{subtopic_id} until cached
+                schedule_image_generation(subtopic_id, explanation)
 
         except Exception as e:
             # Graceful degradation: log error but don't fail the session
@@ -382,51 +1599,32 @@ Do NOT ask a practice question yet - just explain the concept clearly."""
         logger.info("Student asked follow-up question in exposition")
 
         # Build conversation context
-        recent_context = "\n".join(
-            [f"{msg['role']}: {msg['content']}" for msg in state["messages"][-5:]]
-        )
-
-        prompt = f"""
-You are a patient, encouraging GCSE mathematics tutor,
-helping a student learn {state['subtopic_name']}.
-
-The student has asked a follow-up question about the concept you're explaining.
-
-Recent conversation:
-{recent_context}
+        context = recent_context(state)
 
-Your task: Answer their question clearly and helpfully.
-- Be patient and encouraging
-- Provide additional explanation or examples if needed
-- Keep it focused on the concept of {state['subtopic_name']}
-- After answering, ask if they'd like to try a practice question or have more questions
-
-Do NOT ask a practice question yet unless they explicitly request one."""
+        prompt = CONVERSATION_PROMPT.substitute(
+            subtopic_name=state["subtopic_name"], context=context
+        )
 
         try:
-            explanation = await llm_client.generate(prompt)
+            explanation = await _generate_text(prompt, system=FOLLOWUP_SYSTEM)
             logger.info("Generated response to follow-up question")
 
         except Exception as e:
             # Error handling
             logger.error("Follow-up response generation failed: %s", str(e))
-            state["messages"].append(
-                {
-                    "role": "tutor",
-                    "content": (
-                        "I'm having trouble connecting right now. "
-                        f"Please try again in a moment. "
-                        f"(Error: {str(e)})"
-                    ),
-                    "timestamp": datetime.utcnow().isoformat(),
-                }
+            append_message(
+                state,
+                "tutor",
+                (
+                    "I'm having trouble connecting right now. "
+                    f"Please try again in a moment. "
+                    f"(Error: {str(e)})"
+                ),
             )
             return state
 
     # Add message to state (whether cached or freshly generated)
-    state["messages"].append(
-        {"role": "tutor", "content": explanation, "timestamp": datetime.utcnow().isoformat()}
-    )
+    append_message(state, "tutor", explanation)
 
     # Stay in exposition state - wait for student to request a question
     logger.info("← STAYING IN STATE: exposition (waiting for student to request question)")
@@ -444,38 +1642,33 @@ async def questioning_node(state: TutorState) -> TutorState:
     )
 
     # Build context from recent messages
-    recent_context = "\n".join(
-        [
-            f"{msg['role']}: {msg['content']}"
-            for msg in state["messages"][-5:]  # Last 5 messages for context
-        ]
-    )
-
-    prompt = f"""You are a GCSE mathematics tutor teaching {state['subtopic_name']}.
-
-Recent conversation:
-{recent_context}
-
-Your task: Ask ONE clear, appropriate practice question.
-- Make it suitable for GCSE level
-- The question should test understanding of {state['subtopic_name']}
-- Be specific and clear about what you're asking
-- If the question requires numerical calculation, it should be solvable with basic arithmetic
+    context = recent_context(state)  # Last 5 messages for context
 
-Just ask the question - no additional explanation needed."""
+    prompt = CONVERSATION_PROMPT.substitute(subtopic_name=state["subtopic_name"], context=context)
 
     try:
-        question = await llm_client.generate(prompt)
-
-        state["messages"].append(
-            {"role": "tutor", "content": question, "timestamp": datetime.utcnow().isoformat()}
+        response = await llm_client.generate(
+            prompt, system=QUESTIONING_SYSTEM, json_schema=QUESTION_SCHEMA, max_tokens=300
         )
 
+        # Question and calculator classification come back in one response;
+        # fall back to the separate classifier if the JSON is unusable
+        try:
+            parsed = _parse_json_response(response)
+            question = parsed["question"]
+            numerical = bool(parsed["numerical"])
+        except (ValueError, KeyError, TypeError):
+            logger.warning("Question response was not valid JSON, classifying separately")
+            question = response.strip()
+            numerical = await should_show_calculator(question)
+
+        append_message(state, "tutor", question)
+
         state["last_question"] = question
         state["questions_attempted"] += 1
 
         # Determine if calculator should be visible
-        state["calculator_visible"] = await should_show_calculator(question)
+        state["calculator_visible"] = numerical
 
         # Next state: wait for student answer, then evaluate
         # Set to "questioning" so next student response triggers evaluation
@@ -483,17 +1676,67 @@ Just ask the question - no additional explanation needed."""
         logger.info("← TRANSITIONING TO STATE: questioning (waiting for student answer)")
 
     except Exception as e:
-        state["messages"].append(
-            {
-                "role": "tutor",
-                "content": f"I'm having trouble generating a question. Let's try again. (Error: {str(e)})",
-                "timestamp": datetime.utcnow().isoformat(),
-            }
+        append_message(
+            state,
+            "tutor",
+            f"I'm having trouble generating a question. Let's try again. (Error: {str(e)})",
         )
 
     return state
 
 
+async def _request_evaluation(client: LLMClient, prompt: str) -> EvaluationDict:
+    """Ask one LLM client to evaluate an answer.
+
+    Args:
+        client: LLM client to ask
+        prompt: Evaluation prompt (question and student's answer)
+
+    Returns:
+        Parsed evaluation
+    """
+    # Room for the Socratic hint as well as the verdict and feedback
+    response = await client.generate(
+        prompt, system=EVALUATION_SYSTEM, json_schema=EVALUATION_SCHEMA, max_tokens=250
+    )
+    # Bare JSON in structured output mode, possibly fenced in prompt-only mode
+    return _parse_json_response(response)
+
+
+async def _evaluate_answer(prompt: str) -> EvaluationDict:
+    """Evaluate an answer, by consensus of two models if EVAL_CONSENSUS_MODEL is set.
+
+    Both models are asked concurrently, so consensus costs a second call but no
+    extra wall time. If they disagree the answer is treated as incorrect; if one
+    call fails the other's evaluation is used.
+
+    Args:
+        prompt: Evaluation prompt (question and student's answer)
+
+    Returns:
+        Parsed evaluation
+
+    Raises:
+        Exception: If every evaluation call fails
+    """
+    if not EVAL_CONSENSUS_MODEL:
+        return await _request_evaluation(fast_llm_client, prompt)
+
+    clients = (fast_llm_client, get_llm_client(EVAL_CONSENSUS_PROVIDER, EVAL_CONSENSUS_MODEL))
+    results = await asyncio.gather(
+        *(_request_evaluation(client, prompt) for client in clients), return_exceptions=True
+    )
+    evaluations = [result for result in results if not isinstance(result, BaseException)]
+    if not evaluations:
+        raise results[0]
+
+    verdicts = {bool(evaluation.get("correct", False)) for evaluation in evaluations}
+    if len(verdicts) > 1:
+        logger.info("Evaluation CONSENSUS_SPLIT | treating answer as incorrect")
+    # Conservative: a single incorrect verdict wins
+    return min(evaluations, key=lambda evaluation: bool(evaluation.get("correct", False)))
+
+
 async def evaluation_node(state: TutorState) -> TutorState:
     """Evaluate the student's answer.
 
@@ -508,31 +1751,12 @@ async def evaluation_node(state: TutorState) -> TutorState:
         # No answer to evaluate yet
         return state
 
-    prompt = f"""You are evaluating a GCSE mathematics student's answer.
-
-Question: {state.get('last_question', 'N/A')}
-Student's answer: {state['last_student_answer']}
-
-Evaluate the answer and respond with JSON in this exact format:
-{{
-    "correct": true/false,
-    "feedback": "Brief feedback explaining why it's correct or incorrect"
-}}
-
-Be encouraging even when incorrect. Keep feedback brief (1-2 sentences)."""
+    prompt = EVALUATION_PROMPT.substitute(
+        question=state.get("last_question", "N/A"), answer=state["last_student_answer"]
+    )
 
     try:
-        response = await llm_client.generate(prompt)
-
-        # Parse JSON response
-        # Extract JSON from response (handle markdown code blocks)
-        json_str = response.strip()
-        if json_str.startswith("```"):
-            # Remove markdown code blocks
-            lines = json_str.split("\n")
-            json_str = "\n".join(lines[1:-1])
-
-        evaluation = json.loads(json_str)
+        evaluation = await _evaluate_answer(prompt)
 
         state["last_evaluation"] = evaluation
 
@@ -541,13 +1765,7 @@ Be encouraging even when incorrect. Keep feedback brief (1-2 sentences)."""
             state["questions_correct"] += 1
 
             # Add positive feedback
-            state["messages"].append(
-                {
-                    "role": "tutor",
-                    "content": f"✓ {evaluation['feedback']}",
-                    "timestamp": datetime.utcnow().isoformat(),
-                }
-            )
+            append_message(state, "tutor", f"✓ {evaluation['feedback']}")
 
             # Route to questioning for next question
             state["current_state"] = "questioning"
@@ -555,49 +1773,23 @@ Be encouraging even when incorrect. Keep feedback brief (1-2 sentences)."""
         else:
             # Incorrect answer - just acknowledge it, Socratic node will guide
             # Keep feedback brief and don't give away the answer
-            state["messages"].append(
-                {
-                    "role": "tutor",
-                    "content": "Not quite.",
-                    "timestamp": datetime.utcnow().isoformat(),
-                }
-            )
+            append_message(state, "tutor", "Not quite.")
 
-            # Route to diagnosis to analyze the error (then to socratic)
-            state["current_state"] = "diagnosis"
-            logger.info("✗ Answer INCORRECT - routing to diagnosis")
+            # Route straight to Socratic guidance, which uses the socratic_hint
+            # generated with this evaluation (no separate diagnosis or hint call)
+            state["current_state"] = "socratic"
+            logger.info("✗ Answer INCORRECT - routing to socratic")
 
     except Exception as e:
-        state["messages"].append(
-            {
-                "role": "tutor",
-                "content": f"I had trouble evaluating that. Could you try rephrasing your answer? (Error: {str(e)})",
-                "timestamp": datetime.utcnow().isoformat(),
-            }
+        append_message(
+            state,
+            "tutor",
+            f"I had trouble evaluating that. Could you try rephrasing your answer? (Error: {str(e)})",
         )
 
     return state
 
 
-async def diagnosis_node(state: TutorState) -> TutorState:
-    """Identify the student's misconception.
-
-    Analyzes incorrect answers to understand what went wrong.
-    This node doesn't add messages - it just prepares context for socratic node.
-    """
-    logger.info("→ ENTERING STATE: diagnosis (analyzing incorrect answer)")
-
-    # Store diagnostic information in state for socratic node to use
-    # This node is silent - it just analyzes
-    # The socratic node will do the actual guiding
-
-    # Route to socratic guidance
-    state["current_state"] = "socratic"
-    logger.info("← TRANSITIONING TO STATE: socratic (will provide guided hint)")
-
-    return state
-
-
 async def socratic_node(state: TutorState) -> TutorState:
     """Ask guiding questions to help student discover the right approach.
 
@@ -605,53 +1797,42 @@ async def socratic_node(state: TutorState) -> TutorState:
     """
     logger.info("→ ENTERING STATE: socratic (providing Socratic guidance)")
 
-    # Get recent conversation context
-    recent_messages = "\n".join(
-        [f"{msg['role']}: {msg['content']}" for msg in state["messages"][-3:]]
-    )
-
-    prompt = f"""You are a GCSE mathematics tutor using the Socratic method to guide a student.
-
-Original question: {state.get('last_question', 'N/A')}
-Student's incorrect answer: {state['last_student_answer']}
-Topic: {state['subtopic_name']}
-
-Recent conversation:
-{recent_messages}
-
-THE SOCRATIC METHOD - Critical Guidelines:
-1. NEVER tell them what to do
-2. NEVER give the answer or steps
-3. ALWAYS ask a question that makes them think
-4. Focus on ONE key concept they're missing
-5. Guide them to discover the error themselves
+    # Use the hint generated alongside the evaluation, saving an LLM round trip.
+    # Dropped from a copy (state may be a shallow copy sharing the evaluation), so a
+    # rerun from this node's output asks for a fresh hint
+    evaluation = state.get("last_evaluation") or {}
+    hint_question = evaluation.get("socratic_hint")
+    if hint_question:
+        state["last_evaluation"] = {k: v for k, v in evaluation.items() if k != "socratic_hint"}
+        append_message(state, "tutor", hint_question)
+        state["current_state"] = "socratic"
+        logger.info("← STAYING IN STATE: socratic (hint from evaluation)")
+        return state
 
-Examples of good Socratic questions:
-- "When you expand a bracket, how many terms do you need to multiply?"
-- "What does the minus sign in front of a bracket do to the terms inside?"
-- "If you have 5(2y - 3), what are you multiplying 5 by?"
+    # Get recent conversation context
+    recent_messages = recent_context(state, 3)
 
-Your task: Ask ONE simple, focused question that guides them toward understanding.
-Be warm and encouraging. Don't explain - just ask."""
+    prompt = SOCRATIC_PROMPT.substitute(
+        question=state.get("last_question", "N/A"),
+        answer=state["last_student_answer"],
+        subtopic_name=state["subtopic_name"],
+        context=recent_messages,
+    )
 
     try:
-        hint_question = await llm_client.generate(prompt)
+        hint_question = await _generate_text(prompt, system=SOCRATIC_SYSTEM, max_tokens=150)
 
-        state["messages"].append(
-            {"role": "tutor", "content": hint_question, "timestamp": datetime.utcnow().isoformat()}
-        )
+        append_message(state, "tutor", hint_question)
 
         # Stay in socratic state - next student message will be evaluated
         state["current_state"] = "socratic"
         logger.info("← STAYING IN STATE: socratic (waiting for student to try again)")
 
     except Exception:
-        state["messages"].append(
-            {
-                "role": "tutor",
-                "content": "Let's think about this step by step. What's the first thing you need to do when expanding brackets?",
-                "timestamp": datetime.utcnow().isoformat(),
-            }
+        append_message(
+            state,
+            "tutor",
+            "Let's think about this step by step. What's the first thing you need to do when expanding brackets?",
         )
         state["current_state"] = "socratic"
 
@@ -693,13 +1874,7 @@ async def generate_whiteboard_image(
         )
         return None
 
-    # Whiteboard prompt template
-    prompt = f"""
-now take the text from your reply and transform it into a professor's whiteboard image:
-diagrams, arrows, boxes, and captions explaining the core idea visually. Use colors as well.
-
-Text to visualize:
-{exposition_text}"""
+    prompt = WHITEBOARD_PROMPT.substitute(exposition_text=exposition_text)
 
     try:
         # Initialize Google Gemini Client for image generation
@@ -724,9 +1899,9 @@ Text to visualize:
             # 2K images will be generated at 2048x2048 (1:1 aspect ratio)
         )
 
-        # Call Gemini API to generate image
-        response = await asyncio.to_thread(
-            client.models.generate_content, model=model, contents=prompt, config=config
+        # Call Gemini API to generate image (native async client, no worker thread)
+        response = await client.aio.models.generate_content(
+            model=model, contents=prompt, config=config
         )
 
         # Extract PNG image bytes from response
@@ -777,43 +1952,215 @@ Text to visualize:
         return None
 
 
+# In-flight background image generation tasks, keyed by subtopic_id
+_image_tasks: dict[int, asyncio.Task] = {}
+
+
+def is_image_generation_pending(subtopic_id: int) -> bool:
+    """Check whether a whiteboard image is still being generated for a subtopic.
+
+    Args:
+        subtopic_id: Subtopic ID
+
+    Returns:
+        True if a background generation task is running
+    """
+    task = _image_tasks.get(subtopic_id)
+    return task is not None and not task.done()
+
+
+def schedule_image_generation(subtopic_id: int, explanation: str) -> None:
+    """Start background whiteboard image generation for a subtopic.
+
+    Only one task runs per subtopic at a time. The task holds no reference to
+    the request, so it keeps running after the exposition response is sent.
+
+    Args:
+        subtopic_id: Subtopic ID the image is cached under
+        explanation: Exposition text to visualize
+    """
+    if is_image_generation_pending(subtopic_id):
+        logger.info(f"Image generation already in progress | subtopic_id={subtopic_id}")
+        return
+
+    task = asyncio.create_task(_generate_and_cache_image(subtopic_id, explanation))
+    _image_tasks[subtopic_id] = task
+    task.add_done_callback(lambda _task: _image_tasks.pop(subtopic_id, None))
+
+
+async def _generate_and_cache_image(subtopic_id: int, explanation: str) -> None:
+    """Generate, validate and cache a whiteboard image (background task body).
+
+    Args:
+        subtopic_id: Subtopic ID the image is cached under
+        explanation: Exposition text to visualize
+    """
+    try:
+        image_data = await generate_whiteboard_image(
+            exposition_text=explanation,
+            model=IMAGE_GENERATION_MODEL,
+            resolution=IMAGE_GENERATION_RESOLUTION,
+        )
+
+        if image_data:
+            # Validate image before caching
+            if await asyncio.to_thread(validate_image_data, image_data):
+                # Save validated image to cache
+                await asyncio.to_thread(
+                    save_cached_image,
+                    subtopic_id=subtopic_id,
+                    image_data=image_data,
+                    model_identifier=IMAGE_GENERATION_MODEL,
+                    prompt_version="v1",
+                    db_path=DATABASE_PATH,
+                )
+                _image_meta_mem_cache.pop((DATABASE_PATH, subtopic_id), None)
+                logger.info(
+                    f"✓ Image CACHED | "
+                    f"subtopic_id={subtopic_id} | "
+                    f"size={len(image_data)} bytes | "
+                    f"model={IMAGE_GENERATION_MODEL} | "
+                    f"format=PNG | "
+                    f"prompt_version=v1"
+                )
+            else:
+                logger.warning(
+                    f"⚠️ Image VALIDATION_FAILED | "
+                    f"subtopic_id={subtopic_id} | "
+                    f"size={len(image_data)} bytes | "
+                    f"action=not_caching"
+                )
+        else:
+            logger.warning(
+                f"⚠️ Image GENERATION_FAILED | "
+                f"subtopic_id={subtopic_id} | "
+                f"result=None | "
+                f"action=continuing_text_only"
+            )
+
+    except Exception as e:
+        # Graceful degradation: log error, session continues with text-only mode
+        logger.error(
+            f"❌ Image ERROR | "
+            f"subtopic_id={subtopic_id} | "
+            f"error_type={type(e).__name__} | "
+            f"error={str(e)} | "
+            f"action=text_only_fallback",
+            exc_info=True,
+        )
+
+
 # ============================================================================
 # Utility Functions
 # ============================================================================
 
 
+# Markdown code block wrapping a whole response, e.g. ```json\n{...}\n```
+_CODE_FENCE_PATTERN = re.compile(r"^```(?:[\w-]+(?=\s))?\s*(.*?)\s*```$", re.DOTALL)
+
+
+def _strip_code_fence(response: str) -> str:
+    """Remove a surrounding markdown code block from an LLM response.
+
+    Args:
+        response: Raw LLM response
+
+    Returns:
+        Response text without the code fence
+    """
+    text = response.strip()
+    match = _CODE_FENCE_PATTERN.match(text)
+    return match.group(1) if match else text
+
+
+def _parse_json_response(response: str) -> dict:
+    """Parse a JSON object from an LLM response.
+
+    Args:
+        response: Raw LLM response, optionally wrapped in a markdown code block
+
+    Returns:
+        Parsed JSON object
+
+    Raises:
+        ValueError: If the response is not a valid JSON object
+    """
+    parsed = orjson.loads(_strip_code_fence(response))
+    if not isinstance(parsed, dict):
+        raise ValueError("Expected a JSON object")
+    return parsed
+
+
+# Local calculator classifier: a question is NUMERICAL if it contains arithmetic
+# (digit, operator, digit), a decimal, percentage or fraction, or numeric wording,
+# unless it is algebraic (a variable or an algebra/proof verb)
+_NUMERICAL_QUESTION_PATTERN = re.compile(
+    r"\d\s*[-+*/×÷%^]\s*\d|\d+(?:\.\d+|%|/\d+)"
+    r"|\b(?:calculate|compute|evaluate|work out|how many|how much|what is \d)",
+    re.IGNORECASE,
+)
+_ALGEBRA_QUESTION_PATTERN = re.compile(
+    r"\b(?:simplify|expand|factori[sz]e|factor|prove|explain|show that)\b|\b\d*[xyn]\b",
+    re.IGNORECASE,
+)
+
+# LLM classifications keyed by a digest of the question text (LRU)
+_CALCULATOR_CACHE_SIZE = 1024
+_calculator_cache: OrderedDict[bytes, bool] = OrderedDict()
+
+
 async def should_show_calculator(question_text: str) -> bool:
     """Determine if calculator should be visible based on question type.
 
+    Classified locally with regexes. With CALCULATOR_LLM_FALLBACK enabled,
+    questions not recognised as numerical are classified by the LLM once and
+    the result cached by question text.
+
     Args:
         question_text: The question being asked
 
     Returns:
         True if calculator should be shown (numerical problem)
     """
-    prompt = f"""Classify this math question as NUMERICAL or NON_NUMERICAL.
-
-NUMERICAL: Requires actual number computation (e.g., "Calculate 3/4 + 2/5", "What is 15% of 240?")
-NON_NUMERICAL: Algebraic manipulation, proofs, concepts (e.g., "Simplify 2x + 3x", "Explain Pythagoras' theorem")
+    numerical = bool(
+        _NUMERICAL_QUESTION_PATTERN.search(question_text)
+        and not _ALGEBRA_QUESTION_PATTERN.search(question_text)
+    )
+    if numerical or not CALCULATOR_LLM_FALLBACK:
+        return numerical
 
-Question: {question_text}
+    key = hashlib.blake2b(question_text.encode(), digest_size=16).digest()
+    cached = _calculator_cache.get(key)
+    if cached is not None:
+        _calculator_cache.move_to_end(key)
+        return cached
 
-Answer with only one word: NUMERICAL or NON_NUMERICAL"""
+    prompt = CALCULATOR_PROMPT.substitute(question=question_text)
 
     try:
-        response = await llm_client.generate(prompt)
+        response = await fast_llm_client.generate(prompt, system=CALCULATOR_SYSTEM, max_tokens=5)
         logger.info(f"Calculator visibility assessed: {response}")
-        return "NUMERICAL" in response.upper()
     except Exception:
-        # Default to showing calculator if classification fails
+        # Default to hiding calculator if classification fails (not cached)
         return False
 
+    # "NUMERICAL" is a substring of "NON_NUMERICAL", so match the whole word
+    numerical = response.strip().upper().startswith("NUMERICAL")
+    _calculator_cache[key] = numerical
+    if len(_calculator_cache) > _CALCULATOR_CACHE_SIZE:
+        _calculator_cache.popitem(last=False)
+    return numerical
+
 
 # ============================================================================
 # Conditional Routing Functions
 # ============================================================================
 
 
+# Student phrases asking to move on to a question (substring match, like "questions")
+_QUESTION_REQUEST_PATTERN = re.compile(r"question|practice|try|test|quiz", re.IGNORECASE)
+
+
 def route_from_exposition(state: TutorState) -> str:
     """Route from exposition based on student response.
 
@@ -824,9 +2171,8 @@ def route_from_exposition(state: TutorState) -> str:
     if state["messages"]:
         last_msg = state["messages"][-1]
         if last_msg["role"] == "student":
-            content = last_msg["content"].lower()
             # Simple keyword detection
-            if any(word in content for word in ["question", "practice", "try", "test", "quiz"]):
+            if _QUESTION_REQUEST_PATTERN.search(last_msg["content"]):
                 logger.info("→ Routing from exposition to questioning")
                 return "questioning"
 
@@ -847,29 +2193,20 @@ def route_from_evaluation(state: TutorState) -> str:
     """Route from evaluation based on correctness.
 
     - Correct → questioning (new question)
-    - Incorrect → diagnosis (analyze error)
+    - Incorrect → socratic (guided hint)
     """
     if state.get("last_evaluation"):
         if state["last_evaluation"].get("correct", False):
             logger.info("→ Routing from evaluation to questioning (correct answer)")
             return "questioning"
         else:
-            logger.info("→ Routing from evaluation to diagnosis (incorrect answer)")
-            return "diagnosis"
+            logger.info("→ Routing from evaluation to socratic (incorrect answer)")
+            return "socratic"
 
     # Fallback: wait for answer
     return "END"
 
 
-def route_from_diagnosis(_state: TutorState) -> str:
-    """Route from diagnosis to socratic guidance.
-
-    After diagnosing error, provide Socratic hints.
-    """
-    logger.info("→ Routing from diagnosis to socratic")
-    return "socratic"
-
-
 def route_from_socratic(_state: TutorState) -> str:
     """Route from socratic node.
 
@@ -879,6 +2216,53 @@ def route_from_socratic(_state: TutorState) -> str:
     return "END"
 
 
+# Routing functions by source node (used as fallback by route_next)
+ROUTE_FUNCTIONS = {
+    "exposition": route_from_exposition,
+    "questioning": route_from_questioning,
+    "evaluation": route_from_evaluation,
+    "socratic": route_from_socratic,
+}
+
+# Precomputed routing decisions keyed by (node, trigger), where trigger is the
+# only state field the router reads (evaluation correctness) or None.
+# Must stay in sync with the route_from_* functions above (see tests).
+ROUTER_TABLE: dict[tuple[str, Optional[bool]], str] = {
+    ("questioning", None): "END",
+    ("evaluation", True): "questioning",
+    ("evaluation", False): "socratic",
+    ("evaluation", None): "END",
+    ("socratic", None): "END",
+}
+
+
+def route_next(node_name: str, state: TutorState) -> Optional[str]:
+    """Get the next node after node_name using the precomputed router table.
+
+    Falls back to the node's routing function when the decision depends on
+    more than the table key (e.g. exposition keyword detection).
+
+    Args:
+        node_name: Node that just executed
+        state: Current agent state
+
+    Returns:
+        Next node name, "END", or None if node_name has no router
+    """
+    if node_name == "evaluation":
+        evaluation = state.get("last_evaluation")
+        trigger = bool(evaluation.get("correct", False)) if evaluation else None
+    else:
+        trigger = None
+
+    next_node = ROUTER_TABLE.get((node_name, trigger))
+    if next_node is not None:
+        return next_node
+
+    route_func = ROUTE_FUNCTIONS.get(node_name)
+    return route_func(state) if route_func else None
+
+
 # ============================================================================
 # LangGraph State Machine Setup
 # ============================================================================
@@ -897,7 +2281,6 @@ def create_tutor_graph():
     graph.add_node("exposition", exposition_node)
     graph.add_node("questioning", questioning_node)
     graph.add_node("evaluation", evaluation_node)
-    graph.add_node("diagnosis", diagnosis_node)
     graph.add_node("socratic", socratic_node)
 
     # Set entry point
@@ -926,19 +2309,11 @@ def create_tutor_graph():
         route_from_evaluation,
         {
             "questioning": "questioning",  # Correct → new question
-            "diagnosis": "diagnosis",  # Incorrect → analyze error
+            "socratic": "socratic",  # Incorrect → guided hint
             "END": "__end__",
         },
     )
 
-    graph.add_conditional_edges(
-        "diagnosis",
-        route_from_diagnosis,
-        {
-            "socratic": "socratic",  # Always go to Socratic guidance
-        },
-    )
-
     graph.add_conditional_edges(
         "socratic",
         route_from_socratic,
@@ -960,6 +2335,33 @@ tutor_graph = create_tutor_graph()
 # ============================================================================
 
 
+# State fields rebuilt from the messages table on load rather than checkpointed
+_DERIVED_STATE_FIELDS = ("messages", "recent_context_lines")
+
+# One long-lived autocommit connection per database for checkpoint reads and
+# writes, saving a connect per turn. Checkpoints are saved from worker threads,
+# so use of the connections is serialised by the lock.
+_checkpoint_connections: dict[str, sqlite3.Connection] = {}
+_checkpoint_lock = threading.Lock()
+
+
+def _checkpoint_connection(db_path: str) -> sqlite3.Connection:
+    """Get the shared checkpoint connection for a database (call with the lock held).
+
+    Args:
+        db_path: Path to database file
+
+    Returns:
+        SQLite connection in autocommit mode
+    """
+    conn = _checkpoint_connections.get(db_path)
+    if conn is None:
+        conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA synchronous = NORMAL;")
+        _checkpoint_connections[db_path] = conn
+    return conn
+
+
 def save_agent_checkpoint(session_id: int, state: TutorState, db_path: str = "bloom.db") -> None:
     """Save agent state to database for session resumption.
 
@@ -968,28 +2370,105 @@ def save_agent_checkpoint(session_id: int, state: TutorState, db_path: str = "bl
         state: Current agent state
         db_path: Path to database file
     """
-    import sqlite3
+    _write_checkpoints(db_path, [(session_id, _serialize_checkpoint(state))])
 
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
 
-    state_json = json.dumps(state)
+def _serialize_checkpoint(state: TutorState) -> bytes:
+    """Serialize agent state for the agent_checkpoints table.
 
-    cursor.execute(
-        """
-        INSERT OR REPLACE INTO agent_checkpoints (session_id, state_data)
-        VALUES (?, ?)
-    """,
-        (session_id, state_json),
+    Messages live in the append-only messages table, so only the remaining
+    state fields are checkpointed (keeps checkpoint size constant per turn).
+    orjson emits bytes, stored as-is in the state_data column.
+    """
+    return orjson.dumps(
+        {k: v for k, v in state.items() if k not in _DERIVED_STATE_FIELDS}, default=str
     )
 
-    conn.commit()
-    conn.close()
+
+def _write_checkpoints(db_path: str, checkpoints: list[tuple[int, bytes]]) -> None:
+    """Write serialized checkpoints to the database in one statement.
+
+    Args:
+        db_path: Path to database file
+        checkpoints: List of (session_id, state_data) tuples
+    """
+    with _checkpoint_lock:
+        _checkpoint_connection(db_path).executemany(
+            """
+            INSERT OR REPLACE INTO agent_checkpoints (session_id, state_data)
+            VALUES (?, ?)
+        """,
+            checkpoints,
+        )
+
+
+# Checkpoints queued for the background writer, keyed by (db_path, session_id).
+# A newer checkpoint for a session replaces a queued one (last write wins).
+# Only touched from the event loop, apart from lookups in load_agent_checkpoint.
+_pending_checkpoints: dict[tuple[str, int], bytes] = {}
+_checkpoint_writer: Optional[asyncio.Task] = None
+
+
+def queue_agent_checkpoint(session_id: int, state: TutorState, db_path: str = "bloom.db") -> None:
+    """Queue agent state to be saved by the background checkpoint writer.
+
+    Keeps the database write off the request path; load_agent_checkpoint
+    returns queued checkpoints before they are written. Use this or
+    save_agent_checkpoint for a session, not both.
+
+    Args:
+        session_id: Session ID
+        state: Current agent state
+        db_path: Path to database file
+    """
+    global _checkpoint_writer
+    _pending_checkpoints[(db_path, session_id)] = _serialize_checkpoint(state)
+    if _checkpoint_writer is None or _checkpoint_writer.done():
+        _checkpoint_writer = asyncio.create_task(_write_pending_checkpoints())
+
+
+async def _write_pending_checkpoints() -> None:
+    """Write queued checkpoints until the queue is empty (background task body).
+
+    Checkpoints queued while a write is in progress are coalesced into the next.
+    """
+    while _pending_checkpoints:
+        batch = dict(_pending_checkpoints)
+        by_db: dict[str, list[tuple[int, bytes]]] = {}
+        for (db_path, session_id), state_data in batch.items():
+            by_db.setdefault(db_path, []).append((session_id, state_data))
+
+        try:
+            for db_path, checkpoints in by_db.items():
+                await asyncio.to_thread(_write_checkpoints, db_path, checkpoints)
+        except Exception as e:
+            # Left queued: still served by load_agent_checkpoint, retried on next queue
+            logger.error(f"❌ Checkpoint WRITE_FAILED | count={len(batch)} | error={e}")
+            return
+
+        for key, state_data in batch.items():
+            if _pending_checkpoints.get(key) is state_data:
+                del _pending_checkpoints[key]
+
+
+async def flush_agent_checkpoints() -> None:
+    """Wait until all queued checkpoints are written (call on shutdown)."""
+    while _pending_checkpoints:
+        if _checkpoint_writer is None or _checkpoint_writer.done():
+            await _write_pending_checkpoints()
+            if _pending_checkpoints:
+                return  # Write failed (logged); don't spin
+        else:
+            await _checkpoint_writer
 
 
 def load_agent_checkpoint(session_id: int, db_path: str = "bloom.db") -> Optional[TutorState]:
     """Load agent state from database.
 
+    A checkpoint still queued for the background writer is returned in
+    preference to the stored one. Conversation history is rebuilt from the
+    last STATE_MESSAGE_WINDOW rows of the messages table.
+
     Args:
         session_id: Session ID
         db_path: Path to database file
@@ -997,23 +2476,30 @@ def load_agent_checkpoint(session_id: int, db_path: str = "bloom.db") -> Optiona
     Returns:
         Restored agent state or None if no checkpoint found
     """
-    import sqlite3
-
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-
-    cursor.execute(
-        """
-        SELECT state_data
-        FROM agent_checkpoints
-        WHERE session_id = ?
-    """,
-        (session_id,),
-    )
-
-    row = cursor.fetchone()
-    conn.close()
+    state_data = _pending_checkpoints.get((db_path, session_id))
+    if state_data is None:
+        with _checkpoint_lock:
+            cursor = _checkpoint_connection(db_path).execute(
+                """
+                SELECT state_data
+                FROM agent_checkpoints
+                WHERE session_id = ?
+            """,
+                (session_id,),
+            )
+            row = cursor.fetchone()
 
-    if row:
-        return json.loads(row[0])
-    return None
+        if not row:
+            return None
+        state_data = row[0]
+
+    state = orjson.loads(state_data)  # Accepts both bytes and legacy TEXT checkpoints
+    state["messages"] = [
+        {"role": msg["role"], "content": msg["content"], "timestamp": msg["timestamp"]}
+        for msg in get_messages_for_session(session_id, db_path, limit=STATE_MESSAGE_WINDOW)
+    ]
+    state["recent_context_lines"] = _build_recent_context_lines(state["messages"])
+    if state.get("current_state") == "diagnosis":
+        # Checkpoints saved before the diagnosis node was folded into evaluation
+        state["current_state"] = "socratic"
+    return state
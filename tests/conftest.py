@@ -0,0 +1,34 @@
+"""Shared pytest fixtures for Bloom tests."""
+
+import shutil
+
+import pytest
+
+from bloom.database import get_connection, init_database
+
+
+@pytest.fixture(scope="session")
+def _template_db_path(tmp_path_factory):
+    """Create the seeded test database once; tests get a copy of the file."""
+    db_path = tmp_path_factory.mktemp("template") / "template.db"
+
+    # Initialize schema (includes cache tables)
+    init_database(str(db_path))
+
+    # Add test subtopic
+    conn = get_connection(str(db_path))
+    cursor = conn.cursor()
+    cursor.execute("INSERT INTO topics (id, name) VALUES (1, 'Test Topic')")
+    cursor.execute("INSERT INTO subtopics (id, topic_id, name) VALUES (101, 1, 'Test Subtopic')")
+    conn.commit()
+    conn.close()
+
+    return db_path
+
+
+@pytest.fixture
+def test_db_path(tmp_path, _template_db_path):
+    """Create temporary test database with one subtopic."""
+    db_path = tmp_path / "test_bloom.db"
+    shutil.copyfile(_template_db_path, db_path)
+    return str(db_path)
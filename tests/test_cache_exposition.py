@@ -5,35 +5,19 @@ Database tests use temporary SQLite databases for isolation.
 """
 
 import pytest
+import re
 import sqlite3
-from unittest.mock import AsyncMock, patch, MagicMock
-from datetime import datetime
+from unittest.mock import AsyncMock
 
 from bloom.database import (
-    init_database,
     get_cached_exposition,
     save_cached_exposition,
     get_connection,
 )
 
 
-@pytest.fixture
-def test_db_path(tmp_path):
-    """Create temporary test database."""
-    db_path = tmp_path / "test_bloom.db"
-
-    # Initialize schema with cached_expositions table
-    init_database(str(db_path))
-
-    # Add test subtopic
-    conn = get_connection(str(db_path))
-    cursor = conn.cursor()
-    cursor.execute("INSERT INTO topics (id, name) VALUES (1, 'Test Topic')")
-    cursor.execute("INSERT INTO subtopics (id, topic_id, name) VALUES (101, 1, 'Test Subtopic')")
-    conn.commit()
-    conn.close()
-
-    return str(db_path)
+# ISO8601 date and time, as written by database.iso_now
+_ISO_TIMESTAMP_PATTERN = re.compile(r"^\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}")
 
 
 # Note: mock_llm_client moved into test functions to avoid circular import
@@ -65,21 +49,16 @@ def test_save_and_get_cached_exposition(test_db_path):
     assert "generated_at" in result
 
     # Verify timestamp format (ISO8601)
-    timestamp = datetime.fromisoformat(result["generated_at"])
-    assert isinstance(timestamp, datetime)
+    assert _ISO_TIMESTAMP_PATTERN.match(result["generated_at"])
 
 
-@pytest.mark.skip(reason="Circular import: bloom.tutor_agent ↔ bloom.main ↔ bloom.routes.student")
-@pytest.mark.asyncio
-async def test_exposition_node_cache_hit(test_db_path):
-    """Test exposition_node uses cached content without calling LLM.
+def test_exposition_node_cache_hit(test_db_path, monkeypatch):
+    """Test exposition_node uses cached content without calling LLM."""
+    import asyncio
 
-    Note: This test is skipped due to existing circular import in codebase.
-    The cache functionality is tested indirectly via the database tests above
-    and can be verified manually via end-to-end testing.
-    """
     # Import here to avoid circular import during module load
-    from bloom.tutor_agent import exposition_node
+    import bloom.tutor_agent as tutor_agent
+    from bloom.tutor_agent import EXPOSITION_PROMPT_VERSION, exposition_node
 
     # Pre-populate cache
     save_cached_exposition(
@@ -87,6 +66,7 @@ async def test_exposition_node_cache_hit(test_db_path):
         content="Cached exposition about fractions",
         model_identifier="gpt-4",
         db_path=test_db_path,
+        prompt_version=EXPOSITION_PROMPT_VERSION,
     )
 
     # Create initial state (dict matching TutorState structure)
@@ -105,16 +85,15 @@ async def test_exposition_node_cache_hit(test_db_path):
         "hints_given": 0,
     }
 
-    # Mock the LLM client to verify it's not called
-    with patch("bloom.tutor_agent.llm_client") as mock_llm:
-        mock_llm.generate = AsyncMock(return_value="Should not be called")
+    # Fail loudly if the LLM is called (it must not be on a cache hit)
+    async def fail_generate(*args, **kwargs):
+        raise AssertionError("LLM should not be called on a cache hit")
 
-        # Call exposition_node with mocked database path
-        with patch("bloom.tutor_agent.DATABASE_PATH", test_db_path):
-            result_state = await exposition_node(state)
+    monkeypatch.setattr(tutor_agent.llm_client, "generate", fail_generate)
+    monkeypatch.setattr(tutor_agent.llm_client, "generate_stream", fail_generate)
+    monkeypatch.setattr(tutor_agent, "DATABASE_PATH", test_db_path)
 
-        # Verify LLM was NOT called (cache hit)
-        mock_llm.generate.assert_not_called()
+    result_state = asyncio.run(exposition_node(state))
 
     # Verify cached content was used
     assert len(result_state["messages"]) == 1
@@ -122,16 +101,12 @@ async def test_exposition_node_cache_hit(test_db_path):
     assert result_state["messages"][0]["content"] == "Cached exposition about fractions"
 
 
-@pytest.mark.skip(reason="Circular import: bloom.tutor_agent ↔ bloom.main ↔ bloom.routes.student")
-@pytest.mark.asyncio
-async def test_exposition_node_cache_miss(test_db_path):
-    """Test exposition_node generates and caches new content when cache empty.
+def test_exposition_node_cache_miss(test_db_path, monkeypatch):
+    """Test exposition_node generates and caches new content when cache empty."""
+    import asyncio
 
-    Note: This test is skipped due to existing circular import in codebase.
-    The cache functionality is tested indirectly via the database tests above
-    and can be verified manually via end-to-end testing.
-    """
     # Import here to avoid circular import during module load
+    import bloom.tutor_agent as tutor_agent
     from bloom.tutor_agent import exposition_node
 
     # Ensure cache is empty
@@ -154,19 +129,16 @@ async def test_exposition_node_cache_miss(test_db_path):
         "hints_given": 0,
     }
 
-    # Mock the LLM client to avoid real API calls
-    with patch("bloom.tutor_agent.llm_client") as mock_llm:
-        mock_llm.generate = AsyncMock(return_value="This is a test exposition about fractions.")
+    # Mock the LLM call to avoid real API calls
+    mock_generate = AsyncMock(return_value="This is a test exposition about fractions.")
+    monkeypatch.setattr(tutor_agent.llm_client, "generate", mock_generate)
+    monkeypatch.setattr(tutor_agent, "DATABASE_PATH", test_db_path)
+    monkeypatch.setattr(tutor_agent, "LLM_MODEL", "gpt-4-test")
 
-        # Call exposition_node with mocked database path and model
-        with (
-            patch("bloom.tutor_agent.DATABASE_PATH", test_db_path),
-            patch("bloom.tutor_agent.LLM_MODEL", "gpt-4-test"),
-        ):
-            result_state = await exposition_node(state)
+    result_state = asyncio.run(exposition_node(state))
 
-        # Verify LLM WAS called (cache miss)
-        mock_llm.generate.assert_called_once()
+    # Verify LLM WAS called (cache miss)
+    mock_generate.assert_called_once()
 
     # Verify generated content was added to messages
     assert len(result_state["messages"]) == 1
@@ -180,32 +152,29 @@ async def test_exposition_node_cache_miss(test_db_path):
     assert cached["model_identifier"] == "gpt-4-test"
 
 
-def test_model_identifier_tracking(test_db_path):
+@pytest.mark.parametrize(
+    "model,subtopic_id",
+    [("gpt-4", 201), ("claude-3-5-sonnet-20241022", 202), ("gemini-1.5-pro", 203)],
+)
+def test_model_identifier_tracking(test_db_path, model, subtopic_id):
     """Test that model identifier is correctly stored and retrieved."""
-    models = ["gpt-4", "claude-3-5-sonnet-20241022", "gemini-1.5-pro"]
-
-    for idx, model in enumerate(models):
-        # Use higher IDs to avoid conflict with fixture subtopic (101)
-        subtopic_id = 201 + idx
-
-        # Add subtopic for this test
-        conn = get_connection(test_db_path)
-        cursor = conn.cursor()
-        cursor.execute(
-            "INSERT INTO subtopics (id, topic_id, name) VALUES (?, 1, ?)",
-            (subtopic_id, f"Subtopic {subtopic_id}"),
-        )
-        conn.commit()
-        conn.close()
-
-        # Save with specific model
-        save_cached_exposition(
-            subtopic_id=subtopic_id,
-            content=f"Content for {model}",
-            model_identifier=model,
-            db_path=test_db_path,
-        )
-
-        # Verify model is stored
-        cached = get_cached_exposition(subtopic_id, test_db_path)
-        assert cached["model_identifier"] == model
+    # Add subtopic for this test (higher IDs avoid the fixture subtopic, 101)
+    conn = get_connection(test_db_path)
+    conn.execute(
+        "INSERT INTO subtopics (id, topic_id, name) VALUES (?, 1, ?)",
+        (subtopic_id, f"Subtopic {subtopic_id}"),
+    )
+    conn.commit()
+    conn.close()
+
+    # Save with specific model
+    save_cached_exposition(
+        subtopic_id=subtopic_id,
+        content=f"Content for {model}",
+        model_identifier=model,
+        db_path=test_db_path,
+    )
+
+    # Verify model is stored
+    cached = get_cached_exposition(subtopic_id, test_db_path)
+    assert cached["model_identifier"] == model
@@ -0,0 +1,86 @@
+"""Tests for database helper functions in bloom.models.
+
+Database tests use temporary SQLite databases for isolation.
+"""
+
+from bloom.models import (
+    commit_turn,
+    create_session,
+    get_messages_for_session,
+    get_progress_for_subtopic,
+    get_session,
+)
+
+
+def test_commit_turn_persists_messages_counters_and_progress(test_db_path):
+    """Test that a turn's messages, session counters and progress are written together."""
+    session_id = create_session(101, test_db_path)
+
+    commit_turn(
+        session_id,
+        101,
+        [{"role": "tutor", "content": "✓ Correct!"}, {"role": "tutor", "content": "Next question"}],
+        questions_attempted=1,
+        questions_correct=1,
+        question_result=True,
+        completion_threshold=3,
+        db_path=test_db_path,
+    )
+
+    messages = get_messages_for_session(session_id, test_db_path)
+    assert [m["content"] for m in messages] == ["✓ Correct!", "Next question"]
+
+    session = get_session(session_id, test_db_path)
+    assert session["questions_attempted"] == 1
+    assert session["questions_correct"] == 1
+
+    progress = get_progress_for_subtopic(101, test_db_path)
+    assert progress["questions_attempted"] == 1
+    assert progress["questions_correct"] == 1
+    assert progress["is_complete"] is False
+
+
+def test_commit_turn_without_question_leaves_progress_untouched(test_db_path):
+    """Test that progress is only updated when a question was answered this turn."""
+    session_id = create_session(101, test_db_path)
+
+    commit_turn(
+        session_id,
+        101,
+        [{"role": "tutor", "content": "Follow-up answer"}],
+        questions_attempted=0,
+        questions_correct=0,
+        db_path=test_db_path,
+    )
+
+    assert get_progress_for_subtopic(101, test_db_path) is None
+    assert len(get_messages_for_session(session_id, test_db_path)) == 1
+
+
+def test_iso_now_formats_once_per_second(monkeypatch):
+    """Test that iso_now reuses the formatted string until the second changes."""
+    import time
+
+    from bloom import database
+    from bloom.database import iso_now
+
+    clock = [1700000000.2]
+    formatted = []
+    strftime = time.strftime
+
+    def counting_strftime(fmt, t):
+        formatted.append(t)
+        return strftime(fmt, t)
+
+    monkeypatch.setattr(database, "_iso_now_cache", (0, ""))
+    monkeypatch.setattr(database.time, "time", lambda: clock[0])
+    monkeypatch.setattr(database.time, "strftime", counting_strftime)
+
+    assert iso_now() == "2023-11-14T22:13:20+00:00"
+    clock[0] += 0.5
+    assert iso_now() == "2023-11-14T22:13:20+00:00"
+    assert len(formatted) == 1
+
+    clock[0] += 1
+    assert iso_now() == "2023-11-14T22:13:21+00:00"
+    assert len(formatted) == 2
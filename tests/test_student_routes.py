@@ -0,0 +1,239 @@
+"""Tests for the student chat routes.
+
+LLM calls are replaced with fakes; the database is a temporary SQLite file.
+"""
+
+import re
+
+from fastapi.testclient import TestClient
+
+from bloom.models import create_session, get_messages_for_session, get_session
+from bloom.tutor_agent import load_agent_checkpoint, save_agent_checkpoint
+
+
+def _start_questioning_session(db_path: str) -> int:
+    """Create a session waiting for the student's answer to a question."""
+    session_id = create_session(101, db_path)
+    state = {
+        "subtopic_id": 101,
+        "subtopic_name": "Multiplication",
+        "current_state": "questioning",
+        "messages": [],
+        "questions_correct": 0,
+        "questions_attempted": 1,
+        "calculator_visible": False,
+        "last_student_answer": None,
+        "calculator_history": [],
+        "last_question": "What is 6 x 7?",
+        "last_evaluation": None,
+    }
+    save_agent_checkpoint(session_id, state, db_path)
+    return session_id
+
+
+def _start_exposition_session(db_path: str, messages: list[dict]) -> int:
+    """Create a session in the exposition state with the given message history."""
+    session_id = create_session(101, db_path)
+    state = {
+        "subtopic_id": 101,
+        "subtopic_name": "Multiplication",
+        "current_state": "exposition",
+        "messages": messages,
+        "questions_correct": 0,
+        "questions_attempted": 0,
+        "calculator_visible": False,
+        "last_student_answer": None,
+        "calculator_history": [],
+        "last_question": None,
+        "last_evaluation": None,
+    }
+    save_agent_checkpoint(session_id, state, db_path)
+    return session_id
+
+
+def _fake_exposition_llm(monkeypatch, db_path: str):
+    """Point the app at db_path and stream a fixed exposition from a fake LLM."""
+    import bloom.routes.student as student
+    import bloom.tutor_agent as tutor_agent
+
+    async def fake_generate_stream(prompt, system=None, **kwargs):
+        for chunk in ["Multiplying is ", "repeated adding."]:
+            yield chunk
+
+    monkeypatch.setattr(student, "DATABASE_PATH", db_path)
+    monkeypatch.setattr(tutor_agent, "DATABASE_PATH", db_path)
+    monkeypatch.setattr(tutor_agent.llm_client, "generate_stream", fake_generate_stream)
+    monkeypatch.setattr(tutor_agent, "schedule_image_generation", lambda *args: None)
+
+
+def test_chat_message_streams_message_token_and_done_events(test_db_path, monkeypatch):
+    """Test that a turn streams the student message, node tokens, replies, then done."""
+    import bloom.main  # Import the app first: routes import from bloom.main
+    import bloom.routes.student as student
+    import bloom.tutor_agent as tutor_agent
+
+    async def fake_generate(prompt, *args, **kwargs):
+        return '{"correct": false, "feedback": "Not quite."}'
+
+    async def fake_generate_stream(prompt, system=None, **kwargs):
+        for chunk in ["What is ", "6 x 6?"]:
+            yield chunk
+
+    monkeypatch.setattr(student, "DATABASE_PATH", test_db_path)
+    monkeypatch.setattr(tutor_agent, "DATABASE_PATH", test_db_path)
+    monkeypatch.setattr(tutor_agent.llm_client, "generate", fake_generate)
+    monkeypatch.setattr(tutor_agent.llm_client, "generate_stream", fake_generate_stream)
+
+    session_id = _start_questioning_session(test_db_path)
+
+    response = TestClient(bloom.main.app).post(
+        "/chat/message", data={"session_id": session_id, "message": "41"}
+    )
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = re.findall(r"^event: (\w+)$", response.text, flags=re.M)
+    assert events[0] == "message"  # Student's own message first
+    assert "token" in events
+    last_message = max(i for i, event in enumerate(events) if event == "message")
+    assert events.index("token") < last_message  # Hint tokens stream before its bubble
+    assert events[-1] == "done"
+    assert "error" not in events
+    assert 'data: "6 x 6?"' in response.text
+
+    messages = get_messages_for_session(session_id, test_db_path)
+    assert [m["role"] for m in messages] == ["student", "tutor", "tutor"]
+    assert messages[-1]["content"] == "What is 6 x 6?"
+    assert get_session(session_id, test_db_path)["questions_attempted"] == 1
+    assert load_agent_checkpoint(session_id, test_db_path)["current_state"] == "socratic"
+
+
+def test_abandoned_turn_cancels_node_and_persists_completed_work(test_db_path, monkeypatch):
+    """Test that a cancelled turn stops the running node but saves what completed."""
+    import asyncio
+
+    import bloom.main  # noqa: F401  (routes import from bloom.main)
+    import bloom.routes.student as student
+    import bloom.tutor_agent as tutor_agent
+
+    stream_started = asyncio.Event()
+    stream_cancelled = []
+
+    async def fake_generate(prompt, *args, **kwargs):
+        return '{"correct": false, "feedback": "Not quite."}'
+
+    async def fake_generate_stream(prompt, system=None, **kwargs):
+        stream_started.set()
+        try:
+            await asyncio.sleep(60)
+        except asyncio.CancelledError:
+            stream_cancelled.append(True)
+            raise
+        yield "never"
+
+    monkeypatch.setattr(student, "DATABASE_PATH", test_db_path)
+    monkeypatch.setattr(tutor_agent, "DATABASE_PATH", test_db_path)
+    monkeypatch.setattr(tutor_agent.llm_client, "generate", fake_generate)
+    monkeypatch.setattr(tutor_agent.llm_client, "generate_stream", fake_generate_stream)
+    monkeypatch.setattr(student, "_render_message", lambda request, msg, subtopic_id=None: "")
+
+    session_id = _start_questioning_session(test_db_path)
+
+    async def run():
+        async def consume():
+            async for _ in student._stream_chat_turn(None, session_id, "41"):
+                pass
+
+        consumer = asyncio.create_task(consume())
+        await stream_started.wait()
+        consumer.cancel()  # What Starlette does when the client disconnects
+        await asyncio.gather(consumer, return_exceptions=True)
+        await asyncio.gather(*student._abandoned_turns, return_exceptions=True)
+
+    asyncio.run(run())
+
+    assert stream_cancelled == [True]
+    messages = get_messages_for_session(session_id, test_db_path)
+    # Student answer and the evaluation feedback; the cancelled hint is not saved
+    assert [m["role"] for m in messages] == ["student", "tutor"]
+    assert get_session(session_id, test_db_path)["questions_attempted"] == 1
+    assert load_agent_checkpoint(session_id, test_db_path)["current_state"] == "socratic"
+
+
+def test_incorrect_answer_uses_hint_from_evaluation_without_second_call(test_db_path, monkeypatch):
+    """Test that the Socratic hint generated with the evaluation is used directly."""
+    import bloom.main  # noqa: F401  (routes import from bloom.main)
+    import bloom.routes.student as student
+    import bloom.tutor_agent as tutor_agent
+
+    async def fake_generate(prompt, *args, **kwargs):
+        return '{"correct": false, "feedback": "Not quite.", "socratic_hint": "What is 6 x 6?"}'
+
+    async def fail_generate_stream(prompt, system=None, **kwargs):
+        raise AssertionError("the hint should not need another LLM call")
+        yield
+
+    monkeypatch.setattr(student, "DATABASE_PATH", test_db_path)
+    monkeypatch.setattr(tutor_agent, "DATABASE_PATH", test_db_path)
+    monkeypatch.setattr(tutor_agent.llm_client, "generate", fake_generate)
+    monkeypatch.setattr(tutor_agent.llm_client, "generate_stream", fail_generate_stream)
+
+    session_id = _start_questioning_session(test_db_path)
+
+    response = TestClient(bloom.main.app).post(
+        "/chat/message", data={"session_id": session_id, "message": "41"}
+    )
+
+    assert "event: error" not in response.text
+    messages = get_messages_for_session(session_id, test_db_path)
+    assert [m["content"] for m in messages] == ["41", "Not quite.", "What is 6 x 6?"]
+    checkpoint = load_agent_checkpoint(session_id, test_db_path)
+    assert checkpoint["current_state"] == "socratic"
+    assert "socratic_hint" not in checkpoint["last_evaluation"]
+
+
+def test_initial_exposition_streams_from_chat_start(test_db_path, monkeypatch):
+    """Test that a new session's first exposition is streamed, not rendered in one piece."""
+    import bloom.main  # Import the app first: routes import from bloom.main
+
+    _fake_exposition_llm(monkeypatch, test_db_path)
+    session_id = _start_exposition_session(test_db_path, [])
+    client = TestClient(bloom.main.app)
+
+    response = client.get(f"/chat/messages?session_id={session_id}")
+
+    # Nothing generated yet: the page is told to stream the exposition instead
+    assert response.status_code == 204
+    assert response.headers["HX-Trigger"] == "start-lesson"
+    assert get_messages_for_session(session_id, test_db_path) == []
+
+    response = client.post("/chat/start", data={"session_id": session_id})
+
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = re.findall(r"^event: (\w+)$", response.text, flags=re.M)
+    assert events == ["token", "token", "message", "done"]
+    assert 'data-subtopic-id="101"' in response.text  # Exposition shows the whiteboard image
+    messages = get_messages_for_session(session_id, test_db_path)
+    assert [m["content"] for m in messages] == ["Multiplying is repeated adding."]
+
+    # Reloading the page (or a second tab) doesn't generate it again
+    response = client.post("/chat/start", data={"session_id": session_id})
+    assert re.findall(r"^event: (\w+)$", response.text, flags=re.M) == ["message", "done"]
+    assert len(get_messages_for_session(session_id, test_db_path)) == 1
+
+
+def test_retry_streams_rerun_of_current_node(test_db_path, monkeypatch):
+    """Test that retrying streams the re-run node's tokens before its message."""
+    import bloom.main  # Import the app first: routes import from bloom.main
+
+    _fake_exposition_llm(monkeypatch, test_db_path)
+    failed = {"role": "tutor", "content": "I'm having trouble connecting right now."}
+    session_id = _start_exposition_session(test_db_path, [failed])
+
+    response = TestClient(bloom.main.app).post("/chat/retry", data={"session_id": session_id})
+
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = re.findall(r"^event: (\w+)$", response.text, flags=re.M)
+    assert events == ["token", "token", "message", "done"]
+    checkpoint = load_agent_checkpoint(session_id, test_db_path)
+    assert checkpoint["messages"][-1]["content"] == "Multiplying is repeated adding."
@@ -0,0 +1,1019 @@
+"""Tests for tutor agent routing and checkpointing."""
+
+import sqlite3
+
+import pytest
+
+from bloom.models import add_message, create_session
+from bloom.tutor_agent import (
+    ROUTE_FUNCTIONS,
+    ROUTER_TABLE,
+    load_agent_checkpoint,
+    route_next,
+    save_agent_checkpoint,
+)
+
+
+@pytest.mark.parametrize("key", list(ROUTER_TABLE))
+def test_router_table_matches_route_functions(key):
+    """Test that every precomputed routing decision agrees with its routing function."""
+    node_name, correct = key
+    state = {"last_evaluation": {"correct": correct}} if correct is not None else {}
+
+    assert ROUTER_TABLE[key] == ROUTE_FUNCTIONS[node_name](state)
+
+
+def test_route_next_falls_back_to_route_function_for_exposition():
+    """Test that exposition routing (keyword based) uses its routing function."""
+    state = {"messages": [{"role": "student", "content": "Give me a question"}]}
+
+    assert route_next("exposition", state) == "questioning"
+
+    state["messages"][-1]["content"] = "Can I PRACTISE with some Questions?"
+    assert route_next("exposition", state) == "questioning"
+
+    state["messages"][-1]["content"] = "Why does that work?"
+    assert route_next("exposition", state) == "END"
+
+
+def test_checkpoint_excludes_messages_and_rebuilds_them_on_load(test_db_path):
+    """Test that checkpoints store only non-message state and load history from messages."""
+    session_id = create_session(101, test_db_path)
+    add_message(session_id, "tutor", "Explanation", test_db_path)
+    add_message(session_id, "student", "Give me a question", test_db_path)
+
+    state = {
+        "session_id": session_id,
+        "current_state": "questioning",
+        "messages": [{"role": "tutor", "content": "stale", "timestamp": ""}],
+        "questions_attempted": 0,
+    }
+    save_agent_checkpoint(session_id, state, test_db_path)
+
+    conn = sqlite3.connect(test_db_path)
+    state_data = conn.execute(
+        "SELECT state_data FROM agent_checkpoints WHERE session_id = ?", (session_id,)
+    ).fetchone()[0]
+    conn.close()
+    assert b"messages" not in state_data
+
+    loaded = load_agent_checkpoint(session_id, test_db_path)
+    assert loaded["current_state"] == "questioning"
+    assert [(m["role"], m["content"]) for m in loaded["messages"]] == [
+        ("tutor", "Explanation"),
+        ("student", "Give me a question"),
+    ]
+
+
+def test_checkpoints_reuse_one_connection_per_database(test_db_path, monkeypatch):
+    """Test that saving and loading checkpoints doesn't open a connection per call."""
+    import bloom.tutor_agent as tutor_agent
+
+    session_id = create_session(101, test_db_path)
+    save_agent_checkpoint(session_id, {"current_state": "questioning"}, test_db_path)
+    conn = tutor_agent._checkpoint_connections[test_db_path]
+
+    def fail_connect(*args, **kwargs):
+        raise AssertionError("checkpoint connection should be reused")
+
+    monkeypatch.setattr(tutor_agent.sqlite3, "connect", fail_connect)
+    save_agent_checkpoint(session_id, {"current_state": "socratic"}, test_db_path)
+    monkeypatch.undo()  # Messages are still read through a new connection
+
+    assert load_agent_checkpoint(session_id, test_db_path)["current_state"] == "socratic"
+    assert tutor_agent._checkpoint_connections[test_db_path] is conn
+
+
+def test_queued_checkpoints_are_readable_and_coalesced_by_writer(test_db_path, monkeypatch):
+    """Test that queued checkpoints load immediately and are written last-write-wins."""
+    import asyncio
+
+    import bloom.tutor_agent as tutor_agent
+
+    writes = []
+    write_checkpoints = tutor_agent._write_checkpoints
+
+    def recording_write(db_path, checkpoints):
+        writes.append([session_id for session_id, _ in checkpoints])
+        write_checkpoints(db_path, checkpoints)
+
+    monkeypatch.setattr(tutor_agent, "_write_checkpoints", recording_write)
+    session_id = create_session(101, test_db_path)
+
+    async def run():
+        tutor_agent.queue_agent_checkpoint(
+            session_id, {"current_state": "questioning"}, test_db_path
+        )
+        tutor_agent.queue_agent_checkpoint(session_id, {"current_state": "socratic"}, test_db_path)
+        # Readable at once, whether or not the writer has finished
+        queued = await asyncio.to_thread(load_agent_checkpoint, session_id, test_db_path)
+        await tutor_agent.flush_agent_checkpoints()
+        return queued["current_state"]
+
+    assert asyncio.run(run()) == "socratic"
+    assert writes == [[session_id]]  # Both saves coalesced into one write
+    assert tutor_agent._pending_checkpoints == {}
+    assert load_agent_checkpoint(session_id, test_db_path)["current_state"] == "socratic"
+
+
+def test_checkpoint_load_keeps_only_recent_message_window(test_db_path):
+    """Test that resumed state holds the last STATE_MESSAGE_WINDOW messages, in order."""
+    from bloom.models import get_messages_for_session
+    from bloom.tutor_agent import STATE_MESSAGE_WINDOW
+
+    session_id = create_session(101, test_db_path)
+    for i in range(STATE_MESSAGE_WINDOW + 5):
+        add_message(session_id, "student" if i % 2 else "tutor", f"message {i}", test_db_path)
+    save_agent_checkpoint(session_id, {"current_state": "socratic"}, test_db_path)
+
+    loaded = load_agent_checkpoint(session_id, test_db_path)
+
+    assert [m["content"] for m in loaded["messages"]] == [
+        f"message {i}" for i in range(5, STATE_MESSAGE_WINDOW + 5)
+    ]
+    assert len(get_messages_for_session(session_id, test_db_path)) == STATE_MESSAGE_WINDOW + 5
+
+
+def test_legacy_diagnosis_checkpoint_resumes_in_socratic(test_db_path):
+    """Test that checkpoints saved in the removed diagnosis state resume as socratic."""
+    session_id = create_session(101, test_db_path)
+    save_agent_checkpoint(session_id, {"current_state": "diagnosis"}, test_db_path)
+
+    assert load_agent_checkpoint(session_id, test_db_path)["current_state"] == "socratic"
+
+
+def test_image_generation_runs_in_background_and_caches_once(test_db_path, monkeypatch):
+    """Test that image generation is scheduled once per subtopic and cached when done."""
+    import asyncio
+
+    import bloom.tutor_agent as tutor_agent
+    from bloom.database import get_cached_image
+
+    calls = []
+
+    async def fake_generate_whiteboard_image(exposition_text, model, resolution):
+        calls.append(exposition_text)
+        await asyncio.sleep(0)
+        return b"\x89PNG\r\n\x1a\n" + b"0" * 100
+
+    monkeypatch.setattr(tutor_agent, "DATABASE_PATH", test_db_path)
+    monkeypatch.setattr(tutor_agent, "generate_whiteboard_image", fake_generate_whiteboard_image)
+    monkeypatch.setattr(tutor_agent, "validate_image_data", lambda data: True)
+
+    async def run():
+        tutor_agent.schedule_image_generation(101, "Explanation")
+        tutor_agent.schedule_image_generation(101, "Explanation")
+        assert tutor_agent.is_image_generation_pending(101)
+        await asyncio.gather(*tutor_agent._image_tasks.values())
+
+    asyncio.run(run())
+
+    assert calls == ["Explanation"]
+    assert not tutor_agent.is_image_generation_pending(101)
+    assert get_cached_image(101, test_db_path) is not None
+
+
+def test_questioning_node_classifies_calculator_in_same_call(monkeypatch):
+    """Test that the question and calculator visibility come from a single LLM call."""
+    import asyncio
+    from unittest.mock import AsyncMock
+
+    import bloom.tutor_agent as tutor_agent
+
+    generate = AsyncMock(
+        return_value='```json\n{"question": "What is 15% of 240?", "numerical": true}\n```'
+    )
+    monkeypatch.setattr(tutor_agent.llm_client, "generate", generate)
+
+    state = {
+        "subtopic_name": "Percentages",
+        "messages": [],
+        "questions_attempted": 0,
+        "calculator_visible": False,
+    }
+    result = asyncio.run(tutor_agent.questioning_node(state))
+
+    generate.assert_awaited_once()
+    assert result["last_question"] == "What is 15% of 240?"
+    assert result["messages"][-1]["content"] == "What is 15% of 240?"
+    assert result["calculator_visible"] is True
+
+
+def test_llm_batching_combines_concurrent_calls(monkeypatch):
+    """Test that concurrent prompts within the batch window share one LLM request."""
+    import asyncio
+    import json
+
+    import bloom.tutor_agent as tutor_agent
+
+    monkeypatch.setattr(tutor_agent, "LLM_BATCH_WINDOW_MS", 20)
+    client = tutor_agent.LLMClient("openai", "test-model")
+    requests = []
+
+    async def fake_generate_direct(prompt, max_retries=3, system=None, **kwargs):
+        requests.append(prompt)
+        return json.dumps(["Answer A", "Answer B", "Answer C"])
+
+    monkeypatch.setattr(client, "_generate_direct", fake_generate_direct)
+
+    async def run():
+        results = await asyncio.gather(
+            *(client.generate(p, system="SYSTEM") for p in ["A?", "B?", "C?"])
+        )
+        client._batch_task.cancel()
+        return results
+
+    assert asyncio.run(run()) == ["Answer A", "Answer B", "Answer C"]
+    assert len(requests) == 1
+
+
+def test_socratic_node_streams_tokens_to_emitter(monkeypatch):
+    """Test that free-text nodes forward streamed chunks and keep the full message."""
+    import asyncio
+
+    import bloom.tutor_agent as tutor_agent
+
+    async def fake_generate_stream(prompt, system=None, **kwargs):
+        for chunk in ["What ", "is 6 ", "x 7?"]:
+            yield chunk
+
+    monkeypatch.setattr(tutor_agent.llm_client, "generate_stream", fake_generate_stream)
+
+    emitted = []
+    state = {
+        "subtopic_name": "Multiplication",
+        "messages": [],
+        "last_question": "What is 6 x 7?",
+        "last_student_answer": "41",
+    }
+
+    async def run():
+        tutor_agent.token_emitter.set(emitted.append)
+        return await tutor_agent.socratic_node(state)
+
+    result = asyncio.run(run())
+
+    assert emitted == ["What ", "is 6 ", "x 7?"]
+    assert result["messages"][-1]["content"] == "What is 6 x 7?"
+
+
+def test_append_message_maintains_bounded_recent_context():
+    """Test that recent context keeps only the last RECENT_CONTEXT_SIZE formatted lines."""
+    from bloom.tutor_agent import RECENT_CONTEXT_SIZE, append_message, recent_context
+
+    state = {"messages": []}
+    for i in range(RECENT_CONTEXT_SIZE + 3):
+        append_message(state, "student" if i % 2 else "tutor", f"message {i}")
+
+    lines = recent_context(state).split("\n")
+    assert len(lines) == RECENT_CONTEXT_SIZE
+    assert lines[-1] == f"student: message {RECENT_CONTEXT_SIZE + 2}"
+    assert recent_context(state, 2).split("\n") == lines[-2:]
+
+
+def test_recent_context_collapses_whitespace_and_truncates_long_messages():
+    """Test that context lines are canonical, so equivalent turns give identical prompts."""
+    from bloom.tutor_agent import RECENT_CONTEXT_MESSAGE_CHARS, append_message, recent_context
+
+    state = {"messages": []}
+    append_message(state, "tutor", "Fractions   have\n\na numerator " + "x" * 1000)
+    append_message(state, "student", "  give me\ta question ")
+
+    tutor_line, student_line = recent_context(state).split("\n")
+    assert tutor_line.startswith("tutor: Fractions have a numerator x")
+    assert tutor_line.endswith("…")
+    assert len(tutor_line) == len("tutor: ") + RECENT_CONTEXT_MESSAGE_CHARS
+    assert student_line == "student: give me a question"
+    assert state["messages"][-1]["content"] == "  give me\ta question "  # History untouched
+
+
+def test_circuit_breaker_opens_after_consecutive_failures(monkeypatch):
+    """Test that the circuit opens at the threshold and closes after the cool-down."""
+    from bloom.tutor_agent import CircuitBreaker, CircuitOpenError
+
+    clock = [100.0]
+    monkeypatch.setattr("bloom.tutor_agent.time.monotonic", lambda: clock[0])
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=30)
+
+    breaker.record_failure()
+    breaker.check()
+    breaker.record_failure()
+    with pytest.raises(CircuitOpenError):
+        breaker.check()
+
+    clock[0] += 31
+    breaker.check()
+    breaker.record_success()
+    assert breaker.opened_at is None
+
+
+def test_retry_delay_honors_retry_after_on_rate_limit():
+    """Test that 429 responses use Retry-After and other errors use capped jitter."""
+    import httpx
+
+    from bloom.tutor_agent import LLM_RETRY_MAX_DELAY, _retry_delay
+
+    class RateLimited(Exception):
+        status_code = 429
+        response = httpx.Response(429, headers={"retry-after": "7"})
+
+    assert _retry_delay(RateLimited(), attempt=0) == 7.0
+
+    class LongRateLimit(Exception):
+        status_code = 429
+        response = httpx.Response(429, headers={"retry-after": "3600"})
+
+    assert _retry_delay(LongRateLimit(), attempt=0) == LLM_RETRY_MAX_DELAY
+    assert 0.5 <= _retry_delay(RuntimeError("boom"), attempt=0) <= 1.5
+    assert _retry_delay(RuntimeError("boom"), attempt=10) == LLM_RETRY_MAX_DELAY
+
+
+def test_syllabus_reload_drops_in_process_exposition_cache(test_db_path, monkeypatch):
+    """Test that reloading the syllabus invalidates in-process cached expositions."""
+    import asyncio
+
+    import bloom.tutor_agent as tutor_agent
+    from bloom.database import load_syllabus_from_json, save_cached_exposition
+
+    monkeypatch.setattr(tutor_agent, "DATABASE_PATH", test_db_path)
+    save_cached_exposition(
+        101,
+        "Old explanation",
+        "test-model",
+        test_db_path,
+        prompt_version=tutor_agent.EXPOSITION_PROMPT_VERSION,
+    )
+
+    cached = asyncio.run(tutor_agent._get_exposition(101))
+    assert cached["exposition_content"] == "Old explanation"
+
+    # Same subtopic ID, new syllabus: the cascade removes the SQLite cache row
+    load_syllabus_from_json(
+        {"topics": [{"id": 1, "name": "New Topic", "subtopics": [{"id": 101, "name": "New"}]}]},
+        test_db_path,
+    )
+
+    assert asyncio.run(tutor_agent._get_exposition(101)) is None
+
+
+def test_llm_batching_fails_queued_calls_when_dispatcher_stops(monkeypatch):
+    """Test that prompts still queued when the dispatcher stops fail instead of hanging."""
+    import asyncio
+
+    import bloom.tutor_agent as tutor_agent
+
+    monkeypatch.setattr(tutor_agent, "LLM_BATCH_WINDOW_MS", 1000)
+    client = tutor_agent.LLMClient("openai", "test-model")
+
+    async def run():
+        call = asyncio.create_task(client.generate("A?", system="SYSTEM"))
+        await asyncio.sleep(0.01)  # Collected by the dispatcher, waiting for the window
+        client._batch_task.cancel()
+        return await asyncio.wait_for(asyncio.gather(call, return_exceptions=True), 1)
+
+    (result,) = asyncio.run(run())
+    assert isinstance(result, RuntimeError)
+
+
+def test_structured_output_falls_back_to_prompt_only_json(monkeypatch):
+    """Test that a model rejecting response_format is retried without it."""
+    import asyncio
+    from types import SimpleNamespace
+
+    import bloom.tutor_agent as tutor_agent
+
+    class BadRequest(Exception):
+        status_code = 400
+
+    calls = []
+
+    async def create(**kwargs):
+        calls.append(kwargs)
+        if "response_format" in kwargs:
+            raise BadRequest("Invalid parameter: 'response_format' of type 'json_schema'")
+        message = SimpleNamespace(content='```json\n{"correct": true, "feedback": "Yes"}\n```')
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+    client = tutor_agent.LLMClient("openai", "gpt-4-turbo")
+    client._client = SimpleNamespace(
+        chat=SimpleNamespace(completions=SimpleNamespace(create=create))
+    )
+    breaker = tutor_agent.CircuitBreaker(1, 30)
+    monkeypatch.setitem(tutor_agent._circuit_breakers, "openai", breaker)
+
+    async def run():
+        first = await client.generate("Q", json_schema=tutor_agent.EVALUATION_SCHEMA)
+        second = await client.generate("Q", json_schema=tutor_agent.EVALUATION_SCHEMA)
+        return first, second
+
+    first, second = asyncio.run(run())
+
+    assert tutor_agent._parse_json_response(first) == {"correct": True, "feedback": "Yes"}
+    assert second == first
+    assert ["response_format" in call for call in calls] == [True, False, False]
+    breaker.check()  # The rejection is not counted as a failure
+
+
+def test_llm_batching_combines_structured_calls(monkeypatch):
+    """Test that schema-constrained prompts are batched under a wrapping array schema."""
+    import asyncio
+    import json
+
+    import bloom.tutor_agent as tutor_agent
+
+    monkeypatch.setattr(tutor_agent, "LLM_BATCH_WINDOW_MS", 20)
+    client = tutor_agent.LLMClient("openai", "test-model")
+    schemas = []
+
+    async def fake_generate_direct(prompt, max_retries=3, system=None, **kwargs):
+        schemas.append(kwargs["json_schema"])
+        return json.dumps({"responses": [{"question": "A"}, {"question": "B"}]})
+
+    monkeypatch.setattr(client, "_generate_direct", fake_generate_direct)
+
+    async def run():
+        results = await asyncio.gather(
+            *(
+                client.generate(p, system="SYSTEM", json_schema=tutor_agent.QUESTION_SCHEMA)
+                for p in ["A?", "B?"]
+            )
+        )
+        client._batch_task.cancel()
+        return results
+
+    assert [json.loads(r) for r in asyncio.run(run())] == [{"question": "A"}, {"question": "B"}]
+    assert len(schemas) == 1
+    assert schemas[0]["properties"]["responses"]["items"] is tutor_agent.QUESTION_SCHEMA
+
+
+def test_warm_up_opens_connection_to_provider_base_url(monkeypatch):
+    """Test that warm-up sends a request to the SDK base URL on the shared client."""
+    import asyncio
+    from types import SimpleNamespace
+
+    import httpx
+
+    import bloom.tutor_agent as tutor_agent
+
+    requests = []
+
+    def handler(request):
+        requests.append((request.method, str(request.url)))
+        return httpx.Response(404)
+
+    http_client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(tutor_agent, "get_http_client", lambda: http_client)
+
+    client = tutor_agent.LLMClient("openai", "test-model")
+    client._client = SimpleNamespace(base_url=httpx.URL("https://api.openai.com/v1/"))
+
+    asyncio.run(client.warm_up())
+
+    assert requests == [("HEAD", "https://api.openai.com/v1/")]
+
+
+def test_only_transient_llm_errors_are_retried_and_trip_the_circuit(monkeypatch):
+    """Test that 4xx errors fail fast without counting towards the circuit breaker."""
+    import asyncio
+
+    import bloom.tutor_agent as tutor_agent
+
+    class StatusError(Exception):
+        def __init__(self, status_code):
+            super().__init__(f"HTTP {status_code}")
+            self.status_code = status_code
+
+    breaker = tutor_agent.CircuitBreaker(failure_threshold=3, reset_seconds=30)
+    monkeypatch.setitem(tutor_agent._circuit_breakers, "openai", breaker)
+    monkeypatch.setattr(tutor_agent, "_retry_delay", lambda error, attempt: 0)
+
+    client = tutor_agent.LLMClient("openai", "test-model")
+    client._client = object()
+    errors = []
+
+    async def fake_call_provider(*args):
+        raise errors.pop(0)
+
+    monkeypatch.setattr(client, "_call_provider", fake_call_provider)
+
+    errors[:] = [StatusError(401)]
+    with pytest.raises(StatusError):
+        asyncio.run(client.generate("Q"))
+    assert breaker.consecutive_failures == 0
+
+    errors[:] = [StatusError(503), StatusError(429), StatusError(500)]
+    with pytest.raises(RuntimeError):
+        asyncio.run(client.generate("Q"))
+    assert errors == []
+    with pytest.raises(tutor_agent.CircuitOpenError):
+        breaker.check()
+
+
+def test_streamed_calls_update_the_circuit_breaker(monkeypatch):
+    """Test that streamed LLM calls record failures and successes on the breaker."""
+    import asyncio
+
+    import httpx
+
+    import bloom.tutor_agent as tutor_agent
+
+    breaker = tutor_agent.CircuitBreaker(failure_threshold=5, reset_seconds=30)
+    monkeypatch.setitem(tutor_agent._circuit_breakers, "openai", breaker)
+    client = tutor_agent.LLMClient("openai", "test-model")
+    client._client = object()
+    fail = [True]
+
+    async def fake_stream_provider(*args):
+        if fail[0]:
+            raise httpx.ConnectError("connection refused")
+        yield "Hello"
+
+    monkeypatch.setattr(client, "_stream_provider", fake_stream_provider)
+
+    async def collect():
+        return [chunk async for chunk in client.generate_stream("Q")]
+
+    with pytest.raises(httpx.ConnectError):
+        asyncio.run(collect())
+    assert breaker.consecutive_failures == 1
+
+    fail[0] = False
+    assert asyncio.run(collect()) == ["Hello"]
+    assert breaker.consecutive_failures == 0
+
+
+def test_concurrent_exposition_cache_misses_share_one_generation(test_db_path, monkeypatch):
+    """Test that simultaneous cache misses for one subtopic make a single LLM call."""
+    import asyncio
+
+    import bloom.tutor_agent as tutor_agent
+
+    calls = []
+
+    async def fake_generate_text(prompt, system=None, max_tokens=1000):
+        calls.append(prompt)
+        await asyncio.sleep(0.01)
+        return "Explanation"
+
+    monkeypatch.setattr(tutor_agent, "DATABASE_PATH", test_db_path)
+    monkeypatch.setattr(tutor_agent, "_generate_text", fake_generate_text)
+    monkeypatch.setattr(tutor_agent, "schedule_image_generation", lambda *args: None)
+
+    def new_state():
+        return {"subtopic_id": 101, "subtopic_name": "Fractions", "messages": []}
+
+    async def run():
+        return await asyncio.gather(*(tutor_agent.exposition_node(new_state()) for _ in range(3)))
+
+    states = asyncio.run(run())
+
+    assert len(calls) == 1
+    assert [s["messages"][-1]["content"] for s in states] == ["Explanation"] * 3
+    assert tutor_agent._exposition_tasks == {}
+
+
+def test_shared_exposition_streams_tokens_to_every_waiting_request(test_db_path, monkeypatch):
+    """Test that every request joining a generation receives all of its streamed tokens."""
+    import asyncio
+
+    import bloom.tutor_agent as tutor_agent
+
+    first_chunk_sent = asyncio.Event()
+
+    async def fake_generate_text(prompt, system=None, max_tokens=1000):
+        emit = tutor_agent.token_emitter.get()
+        emit("Explan")
+        first_chunk_sent.set()
+        await asyncio.sleep(0.01)
+        emit("ation")
+        return "Explanation"
+
+    monkeypatch.setattr(tutor_agent, "DATABASE_PATH", test_db_path)
+    monkeypatch.setattr(tutor_agent, "_generate_text", fake_generate_text)
+    monkeypatch.setattr(tutor_agent, "schedule_image_generation", lambda *args: None)
+
+    streams = {"first": [], "joiner": [], "prewarm": []}
+
+    async def exposition(name):
+        tutor_agent.token_emitter.set(streams[name].append)
+        state = {"subtopic_id": 101, "subtopic_name": "Fractions", "messages": []}
+        return await tutor_agent.exposition_node(state)
+
+    async def prewarm():
+        # A prewarm started from a streaming turn must not write into its stream
+        tutor_agent.token_emitter.set(streams["prewarm"].append)
+        return await tutor_agent.prewarm_expositions([(101, "Fractions")])
+
+    async def run():
+        first = asyncio.create_task(exposition("first"))
+        await first_chunk_sent.wait()
+        return await asyncio.gather(first, exposition("joiner"), prewarm())
+
+    asyncio.run(run())
+
+    assert streams == {"first": ["Explan", "ation"], "joiner": ["Explan", "ation"], "prewarm": []}
+    assert tutor_agent._exposition_tasks == {}
+
+
+def test_exposition_from_older_prompt_is_treated_as_cache_miss(test_db_path, monkeypatch):
+    """Test that editing the exposition prompt invalidates expositions cached from the old one."""
+    import asyncio
+
+    import bloom.tutor_agent as tutor_agent
+    from bloom.database import get_cached_exposition, save_cached_exposition
+
+    async def fake_generate_text(prompt, system=None, max_tokens=1000):
+        return "New explanation"
+
+    monkeypatch.setattr(tutor_agent, "DATABASE_PATH", test_db_path)
+    monkeypatch.setattr(tutor_agent, "_generate_text", fake_generate_text)
+    monkeypatch.setattr(tutor_agent, "schedule_image_generation", lambda *args: None)
+    save_cached_exposition(101, "Old explanation", "test-model", test_db_path, prompt_version="v1")
+
+    state = {"subtopic_id": 101, "subtopic_name": "Fractions", "messages": []}
+    state = asyncio.run(tutor_agent.exposition_node(state))
+
+    assert state["messages"][-1]["content"] == "New explanation"
+    cached = get_cached_exposition(101, test_db_path)
+    assert cached["prompt_version"] == tutor_agent.EXPOSITION_PROMPT_VERSION
+
+
+def test_should_show_calculator_short_circuits_and_caches(monkeypatch):
+    """Test that arithmetic skips the LLM and other questions are classified once."""
+    import asyncio
+
+    import bloom.tutor_agent as tutor_agent
+
+    calls = []
+
+    async def fake_generate(prompt, *args, **kwargs):
+        calls.append(prompt)
+        return "NON_NUMERICAL"
+
+    monkeypatch.setattr(tutor_agent.llm_client, "generate", fake_generate)
+    monkeypatch.setattr(tutor_agent, "_calculator_cache", tutor_agent.OrderedDict())
+    monkeypatch.setattr(tutor_agent, "CALCULATOR_LLM_FALLBACK", True)
+
+    async def run():
+        return [
+            await tutor_agent.should_show_calculator("Work out 3.5 * 12"),
+            await tutor_agent.should_show_calculator("Simplify 2x + 3x"),
+            await tutor_agent.should_show_calculator("Simplify 2x + 3x"),
+        ]
+
+    assert asyncio.run(run()) == [True, False, False]
+    assert len(calls) == 1
+
+
+@pytest.mark.parametrize(
+    "question, numerical",
+    [
+        ("Calculate 3/4 + 2/5", True),
+        ("What is 15% of 240?", True),
+        ("A bag of apples costs £2.40. How much do 3 bags cost?", True),
+        ("Simplify 2x + 3x", False),
+        ("Solve 3x + 4 = 19", False),
+        ("Explain Pythagoras' theorem", False),
+        ("Name the shape with four equal sides", False),
+    ],
+)
+def test_should_show_calculator_classifies_locally(question, numerical, monkeypatch):
+    """Test that the calculator is classified without an LLM call by default."""
+    import asyncio
+
+    import bloom.tutor_agent as tutor_agent
+
+    async def fail_generate(*args, **kwargs):
+        raise AssertionError("classification should not call the LLM")
+
+    monkeypatch.setattr(tutor_agent.fast_llm_client, "generate", fail_generate)
+    monkeypatch.setattr(tutor_agent, "CALCULATOR_LLM_FALLBACK", False)
+
+    assert asyncio.run(tutor_agent.should_show_calculator(question)) is numerical
+
+
+def test_classification_calls_use_fast_llm_client(monkeypatch):
+    """Test that answer evaluation and calculator classification go to the fast model."""
+    import asyncio
+
+    import bloom.tutor_agent as tutor_agent
+
+    class FakeClient:
+        def __init__(self):
+            self.systems = []
+
+        async def generate(self, prompt, *args, system=None, **kwargs):
+            self.systems.append(system)
+            if system == tutor_agent.EVALUATION_SYSTEM:
+                return '{"correct": true, "feedback": "Well done."}'
+            return "NON_NUMERICAL"
+
+    main_client, fast_client = FakeClient(), FakeClient()
+    monkeypatch.setattr(tutor_agent, "llm_client", main_client)
+    monkeypatch.setattr(tutor_agent, "fast_llm_client", fast_client)
+    monkeypatch.setattr(tutor_agent, "_calculator_cache", tutor_agent.OrderedDict())
+    monkeypatch.setattr(tutor_agent, "CALCULATOR_LLM_FALLBACK", True)
+
+    state = {
+        "messages": [],
+        "last_question": "What is 6 x 7?",
+        "last_student_answer": "42",
+        "questions_correct": 0,
+    }
+    asyncio.run(tutor_agent.evaluation_node(state))
+    asyncio.run(tutor_agent.should_show_calculator("Explain why a square has four lines"))
+
+    assert fast_client.systems == [tutor_agent.EVALUATION_SYSTEM, tutor_agent.CALCULATOR_SYSTEM]
+    assert main_client.systems == []
+
+
+def test_whiteboard_image_uses_async_genai_client(monkeypatch):
+    """Test that image generation awaits the genai async API instead of a worker thread."""
+    import asyncio
+    from types import SimpleNamespace
+
+    from google import genai
+
+    import bloom.tutor_agent as tutor_agent
+
+    calls = []
+
+    async def fake_generate_content(model, contents, config):
+        calls.append(model)
+        part = SimpleNamespace(inline_data=SimpleNamespace(data=b"png-bytes"))
+        return SimpleNamespace(parts=[part])
+
+    class FakeClient:
+        def __init__(self, api_key=None):
+            self.aio = SimpleNamespace(
+                models=SimpleNamespace(generate_content=fake_generate_content)
+            )
+
+    async def no_threads(*args, **kwargs):
+        raise AssertionError("image generation should not use a worker thread")
+
+    monkeypatch.setattr(tutor_agent, "ENABLE_IMAGE_GENERATION", True)
+    monkeypatch.setattr(genai, "Client", FakeClient)
+    monkeypatch.setattr(asyncio, "to_thread", no_threads)
+
+    image = asyncio.run(tutor_agent.generate_whiteboard_image("Fractions", "image-model", "2K"))
+
+    assert image == b"png-bytes"
+    assert calls == ["image-model"]
+
+
+def test_image_cache_stats_count_every_lookup_but_log_periodically(monkeypatch, caplog):
+    """Test that cache stats stay exact while the summary is only logged every interval."""
+    import logging
+
+    import bloom.tutor_agent as tutor_agent
+
+    monkeypatch.setattr(
+        tutor_agent, "_image_cache_stats", {"hits": 0, "misses": 0, "hit_rate": 0.0}
+    )
+    monkeypatch.setattr(tutor_agent, "_IMAGE_CACHE_STATS_LOG_INTERVAL", 4)
+
+    with caplog.at_level(logging.INFO, logger="bloom.tutor_agent"):
+        for is_hit in [True, True, False, True, True]:
+            tutor_agent._update_cache_stats(is_hit)
+
+    assert tutor_agent.get_image_cache_stats() == {"hits": 4, "misses": 1, "hit_rate": 80.0}
+    assert len([r for r in caplog.records if "Image cache stats" in r.message]) == 1
+
+
+def test_prewarm_expositions_generates_uncached_subtopics_concurrently(test_db_path, monkeypatch):
+    """Test that prewarming skips cached subtopics and runs generations in parallel."""
+    import asyncio
+
+    import bloom.tutor_agent as tutor_agent
+    from bloom.database import get_cached_exposition, save_cached_exposition
+    from bloom.models import get_upcoming_subtopics
+
+    conn = sqlite3.connect(test_db_path)
+    conn.executemany(
+        "INSERT INTO subtopics (id, topic_id, name) VALUES (?, 1, ?)",
+        [(102, "Fractions"), (103, "Decimals"), (104, "Percentages")],
+    )
+    conn.commit()
+    conn.close()
+
+    running, peak = 0, 0
+
+    async def fake_generate_text(prompt, system=None, max_tokens=1000):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        return f"Explanation of {prompt}"
+
+    monkeypatch.setattr(tutor_agent, "DATABASE_PATH", test_db_path)
+    monkeypatch.setattr(tutor_agent, "_generate_text", fake_generate_text)
+    save_cached_exposition(
+        102,
+        "Cached",
+        "test-model",
+        test_db_path,
+        prompt_version=tutor_agent.EXPOSITION_PROMPT_VERSION,
+    )
+
+    upcoming = get_upcoming_subtopics(101, 3, test_db_path)
+    assert upcoming == [(102, "Fractions"), (103, "Decimals"), (104, "Percentages")]
+
+    assert asyncio.run(tutor_agent.prewarm_expositions(upcoming)) == 2
+    assert peak == 2
+    assert get_cached_exposition(102, test_db_path)["exposition_content"] == "Cached"
+    assert get_cached_exposition(104, test_db_path)["exposition_content"] == (
+        "Explanation of Topic: Percentages"
+    )
+
+
+def test_get_llm_client_returns_one_client_per_provider_and_model():
+    """Test that LLM clients are shared singletons per (provider, model)."""
+    from bloom.tutor_agent import get_llm_client
+
+    client = get_llm_client("anthropic", "claude-3-haiku-20240307")
+
+    assert get_llm_client("anthropic", "claude-3-haiku-20240307") is client
+    assert get_llm_client("anthropic", "claude-3-5-sonnet-20241022") is not client
+    assert client.provider == "anthropic"
+    assert client.model == "claude-3-haiku-20240307"
+
+
+def test_evaluation_consensus_marks_split_verdict_incorrect(monkeypatch):
+    """Test that with consensus enabled, one incorrect verdict makes the answer incorrect."""
+    import asyncio
+
+    import bloom.tutor_agent as tutor_agent
+
+    class FakeClient:
+        def __init__(self, response):
+            self.response = response
+
+        async def generate(self, prompt, *args, **kwargs):
+            return self.response
+
+    correct = FakeClient('{"correct": true, "feedback": "Yes!", "socratic_hint": null}')
+    incorrect = FakeClient('{"correct": false, "feedback": "No.", "socratic_hint": "Hmm?"}')
+    monkeypatch.setattr(tutor_agent, "EVAL_CONSENSUS_MODEL", "second-model")
+    monkeypatch.setattr(tutor_agent, "fast_llm_client", correct)
+    monkeypatch.setattr(tutor_agent, "get_llm_client", lambda provider, model: incorrect)
+
+    state = {
+        "messages": [],
+        "last_question": "What is 6 x 7?",
+        "last_student_answer": "42",
+        "questions_correct": 0,
+    }
+    state = asyncio.run(tutor_agent.evaluation_node(state))
+
+    assert state["last_evaluation"]["socratic_hint"] == "Hmm?"
+    assert state["questions_correct"] == 0
+    assert state["current_state"] == "socratic"
+
+
+def test_llm_inflight_limit_caps_concurrent_requests(monkeypatch):
+    """Test that requests beyond LLM_INFLIGHT_LIMIT wait for a free slot."""
+    import asyncio
+
+    import bloom.tutor_agent as tutor_agent
+
+    peak = {"now": 0, "max": 0}
+
+    async def fake_call_provider(*args, **kwargs):
+        peak["now"] += 1
+        peak["max"] = max(peak["max"], peak["now"])
+        await asyncio.sleep(0.01)
+        peak["now"] -= 1
+        return "ok"
+
+    client = tutor_agent.LLMClient("openai", "test-model")
+    monkeypatch.setattr(tutor_agent, "LLM_INFLIGHT_LIMIT", 2)
+    monkeypatch.setattr(client, "_get_client", lambda: object())
+    monkeypatch.setattr(client, "_call_provider", fake_call_provider)
+
+    async def run():
+        return await asyncio.gather(*(client._generate_direct("prompt") for _ in range(6)))
+
+    assert asyncio.run(run()) == ["ok"] * 6
+    assert peak["max"] == 2
+    assert tutor_agent.get_llm_call_stats()["inflight"] == 0
+
+
+def test_llm_client_rejects_unknown_provider_at_construction():
+    """Test that an unknown provider fails when the client is built, not per call."""
+    import bloom.tutor_agent as tutor_agent
+
+    with pytest.raises(ValueError, match="Unknown LLM provider"):
+        tutor_agent.LLMClient("mystery", "test-model")
+
+    client = tutor_agent.LLMClient("xai", "test-model")
+    assert client._call_provider == client._call_openai
+
+
+def test_parse_json_response_strips_code_fences():
+    """Test that fenced JSON parses, including a fence on a single line."""
+    import bloom.tutor_agent as tutor_agent
+
+    expected = {"correct": True, "feedback": "Yes"}
+    for response in [
+        '{"correct": true, "feedback": "Yes"}',
+        '```json\n{"correct": true, "feedback": "Yes"}\n```',
+        '  ```\n{"correct": true,\n "feedback": "Yes"}\n```  ',
+        '```json {"correct": true, "feedback": "Yes"}```',
+    ]:
+        assert tutor_agent._parse_json_response(response) == expected
+
+
+def test_circuit_breakers_are_per_provider(monkeypatch):
+    """Test that an outage on one provider does not short-circuit another."""
+    import bloom.tutor_agent as tutor_agent
+
+    monkeypatch.setattr(tutor_agent, "_circuit_breakers", {})
+    openai_breaker = tutor_agent.get_circuit_breaker("openai")
+    assert tutor_agent.get_circuit_breaker("openai") is openai_breaker
+    for _ in range(tutor_agent.LLM_CIRCUIT_FAILURE_THRESHOLD):
+        openai_breaker.record_failure()
+
+    with pytest.raises(tutor_agent.CircuitOpenError):
+        openai_breaker.check()
+    tutor_agent.get_circuit_breaker("anthropic").check()
+
+
+def test_generate_fails_over_to_fallback_provider(monkeypatch):
+    """Test that a call whose retries are exhausted is retried on the fallback provider."""
+    import asyncio
+
+    import httpx
+
+    import bloom.tutor_agent as tutor_agent
+
+    async def failing_call_provider(*args, **kwargs):
+        raise httpx.ConnectError("connection refused")
+
+    fallback_calls = []
+
+    class FallbackClient:
+        provider, model = "anthropic", "fallback-model"
+
+        async def generate(self, prompt, **kwargs):
+            fallback_calls.append(kwargs)
+            return f"fallback: {prompt}"
+
+    monkeypatch.setattr(tutor_agent, "_circuit_breakers", {})
+    monkeypatch.setattr(tutor_agent, "_retry_delay", lambda error, attempt: 0)
+    monkeypatch.setattr(tutor_agent, "LLM_FALLBACK_PROVIDER", "anthropic")
+    monkeypatch.setattr(tutor_agent, "LLM_FALLBACK_MODEL", "fallback-model")
+    monkeypatch.setattr(tutor_agent, "get_llm_client", lambda provider, model: FallbackClient())
+    client = tutor_agent.LLMClient("openai", "test-model")
+    monkeypatch.setattr(client, "_get_client", lambda: object())
+    monkeypatch.setattr(client, "_call_provider", failing_call_provider)
+
+    schema = {"type": "object"}
+    response = asyncio.run(client.generate("Q", json_schema=schema, max_tokens=123))
+
+    assert response == "fallback: Q"
+    assert fallback_calls[0]["json_schema"] is schema
+    assert fallback_calls[0]["max_tokens"] == 123
+    assert tutor_agent._fallback_llm_client("anthropic") is None  # No failover loop
+
+
+def test_exposition_survives_cache_write_failure(monkeypatch):
+    """Test that a failed SQLite cache write still returns and memory-caches the exposition."""
+    import asyncio
+    from collections import OrderedDict
+
+    import bloom.tutor_agent as tutor_agent
+
+    async def fake_generate_text(prompt, system=None, max_tokens=1000):
+        return "Fresh explanation"
+
+    def failing_save(**kwargs):
+        raise sqlite3.OperationalError("database is locked")
+
+    monkeypatch.setattr(tutor_agent, "_generate_text", fake_generate_text)
+    monkeypatch.setattr(tutor_agent, "save_cached_exposition", failing_save)
+    monkeypatch.setattr(tutor_agent, "_exposition_mem_cache", OrderedDict())
+
+    explanation = asyncio.run(tutor_agent._generate_and_cache_exposition(101, "Multiplication"))
+
+    assert explanation == "Fresh explanation"
+    cached = asyncio.run(tutor_agent._get_exposition(101))
+    assert cached["exposition_content"] == "Fresh explanation"
+
+
+def test_socratic_node_does_not_mutate_shared_evaluation():
+    """Test that using the evaluation's hint leaves the caller's evaluation dict intact."""
+    import asyncio
+
+    import bloom.tutor_agent as tutor_agent
+
+    evaluation = {"correct": False, "feedback": "Not quite.", "socratic_hint": "What is 6 x 6?"}
+    state = {"messages": [], "last_evaluation": evaluation}
+
+    # Shallow copy, as the chat route makes before running a node
+    result = asyncio.run(tutor_agent.socratic_node(dict(state, messages=[])))
+
+    assert result["messages"][-1]["content"] == "What is 6 x 6?"
+    assert "socratic_hint" not in result["last_evaluation"]
+    assert evaluation["socratic_hint"] == "What is 6 x 6?"